@@ -1,10 +1,14 @@
 import motor.motor_asyncio
-import pymongo
+import asyncio
 from bson import ObjectId
+from pymongo import IndexModel
 from pymongo.errors import DuplicateKeyError
 import os
 from dotenv import load_dotenv
 import logging
+from app.utils.indexes import reconcile_indexes
+from app.utils.mongo_monitoring import PoolStatsListener, CommandStatsListener
+from app.utils.dirty_users import DIRTY_USER_TTL_SECONDS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -17,27 +21,63 @@ load_dotenv()
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DB_NAME = os.getenv("DB_NAME", "recommendation_system")
 
-# Create a synchronous client for testing connection
-sync_client = pymongo.MongoClient(MONGODB_URL)
+# Connection pool sizing; size max pool for (workers x concurrent DB calls)
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = os.getenv("MONGODB_MAX_IDLE_TIME_MS")
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS")
+
+def _pool_options():
+    options = {
+        "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+        "minPoolSize": MONGODB_MIN_POOL_SIZE,
+    }
+    if MONGODB_MAX_IDLE_TIME_MS:
+        options["maxIdleTimeMS"] = int(MONGODB_MAX_IDLE_TIME_MS)
+    if MONGODB_WAIT_QUEUE_TIMEOUT_MS:
+        options["waitQueueTimeoutMS"] = int(MONGODB_WAIT_QUEUE_TIMEOUT_MS)
+    return options
+
+pool_listener = PoolStatsListener()
+
+# Create async client
+# connect=False defers connecting to first use, so the client is safe to create
+# in a gunicorn master that forks workers afterwards
+client = motor.motor_asyncio.AsyncIOMotorClient(
+    MONGODB_URL,
+    connect=False,
+    event_listeners=[pool_listener, CommandStatsListener()],
+    **_pool_options()
+)
+db = client[DB_NAME]
+
+async def ping():
+    """Round-trip to the server through the shared async client."""
+    await client.admin.command('ping')
 
 # Test the connection
-def test_connection():
+async def check_connection():
     try:
-        sync_client.admin.command('ping')
+        await ping()
         logger.info("Successfully connected to MongoDB")
         return True
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
         return False
 
-# Create async client
-client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
-db = client[DB_NAME]
+def get_db():
+    """FastAPI dependency returning the shared database handle."""
+    return db
+
+def pool_stats():
+    """Connection pool configuration and current utilization."""
+    return {**_pool_options(), **pool_listener.stats()}
 
 # Collections
 users = db.users
 swipes = db.swipes
 recommendations = db.recommendations
+matches = db.matches
 
 # Helper function to convert MongoDB ObjectId to string
 def serialize_object_id(obj):
@@ -45,35 +85,114 @@ def serialize_object_id(obj):
         return str(obj)
     return obj
 
+# Declared indexes per collection; init_db reconciles the database against these
+INDEX_SPECS = {
+    "users": [
+        IndexModel("email", unique=True),
+        IndexModel("name"),
+        IndexModel("location"),
+        IndexModel("location_key"),
+        IndexModel("gender"),
+        IndexModel("preferred_gender"),
+        # Equality filters first, then the sort/range keys used by /users
+        IndexModel([("gender", 1), ("preferred_gender", 1), ("age", 1), ("_id", 1)]),
+        IndexModel([("gender", 1), ("preferred_gender", 1), ("_id", 1)]),
+        IndexModel([("age", 1), ("_id", 1)]),
+        # Most liked profiles first, per gender
+        IndexModel([("gender", 1), ("like_rate", -1), ("_id", 1)]),
+    ],
+    "swipes": [
+        IndexModel([("swiper_id", 1), ("swiped_id", 1)], unique=True),
+        IndexModel("created_at"),
+    ],
+    "matches": [
+        IndexModel([("user1_id", 1), ("user2_id", 1)], unique=True),
+        # One range read per side of the pair, already in /matches order
+        IndexModel([("user1_id", 1), ("created_at", -1), ("_id", -1)]),
+        IndexModel([("user2_id", 1), ("created_at", -1), ("_id", -1)]),
+    ],
+    "dirty_users": [
+        # Read oldest first; marks that are only peeked, never drained, expire here
+        IndexModel("marked_at", expireAfterSeconds=DIRTY_USER_TTL_SECONDS),
+    ],
+    "recommendations": [
+        IndexModel([("user_id", 1), ("recommended_id", 1)], unique=True),
+        IndexModel("created_at"),
+        IndexModel("title_key"),
+        IndexModel([("title", "text"), ("description", "text")]),
+        IndexModel([("category", 1), ("_id", 1)]),
+        IndexModel([("rating", -1), ("_id", 1)]),
+        IndexModel([("category", 1), ("rating", -1), ("_id", 1)]),
+    ],
+}
+
+# "apply" reconciles indexes at startup, "dry-run" only logs the plan, "off" skips it
+INDEX_RECONCILE = os.getenv("INDEX_RECONCILE", "apply").lower()
+# Dropping indexes that INDEX_SPECS does not declare is opt-in: it would also drop
+# ones created by hand or by other tools against the same database
+INDEX_DROP_OBSOLETE = os.getenv("INDEX_DROP_OBSOLETE", "false").lower() == "true"
+# Build indexes in a background task so startup does not wait for them
+INDEX_BUILD_BACKGROUND = os.getenv("INDEX_BUILD_BACKGROUND", "false").lower() == "true"
+
+_index_task = None
+
+async def sync_indexes(dry_run: bool = False, drop_obsolete: bool = INDEX_DROP_OBSOLETE):
+    """Reconcile every collection in INDEX_SPECS and return the plan per collection."""
+    plans = {}
+    for name, declared in INDEX_SPECS.items():
+        try:
+            plans[name] = await reconcile_indexes(db[name], declared, dry_run=dry_run, drop_obsolete=drop_obsolete)
+        except Exception as e:
+            # One collection failing (e.g. duplicates blocking a unique index) must not block the others
+            logger.error(f"Error reconciling indexes for {name}: {e}")
+            plans[name] = {"error": str(e)}
+    return plans
+
+async def _prepare_collections():
+    if INDEX_RECONCILE != "off":
+        await sync_indexes(dry_run=INDEX_RECONCILE == "dry-run")
+
+    # Backfill the normalized location used by indexed location search
+    await users.update_many(
+        {"location_key": {"$exists": False}, "location": {"$type": "string"}},
+        [{"$set": {"location_key": {"$toLower": {"$trim": {"input": "$location"}}}}}]
+    )
+    # ...and the normalized title used by prefix search on /recommendations
+    await recommendations.update_many(
+        {"title_key": {"$exists": False}, "title": {"$type": "string"}},
+        [{"$set": {"title_key": {"$toLower": {"$trim": {"input": "$title"}}}}}]
+    )
+    logger.info("Database initialization complete")
+
 # Function to initialize the database with indexes
 async def init_db():
     """Initialize database with required collections and indexes."""
+    global _index_task
     try:
-        # Drop existing indexes
-        await users.drop_indexes()
-        await swipes.drop_indexes()
-        await recommendations.drop_indexes()
-        
-        # Create indexes for users collection
-        await users.create_index("email", unique=True)
-        await users.create_index("name")
-        await users.create_index("location")
-        await users.create_index("gender")
-        await users.create_index("preferred_gender")
-        
-        # Create indexes for swipes collection
-        await swipes.create_index([("swiper_id", 1), ("swiped_id", 1)], unique=True)
-        await swipes.create_index("created_at")
-        
-        # Create indexes for recommendations collection
-        await recommendations.create_index([("user_id", 1), ("recommended_id", 1)], unique=True)
-        await recommendations.create_index("created_at")
-        
-        logger.info("Database initialization complete")
+        if INDEX_BUILD_BACKGROUND:
+            _index_task = asyncio.create_task(_prepare_collections())
+            _index_task.add_done_callback(
+                lambda task: task.cancelled() or task.exception() is None
+                or logger.error(f"Error initializing database: {task.exception()}")
+            )
+            logger.info("Database initialization continues in the background")
+        else:
+            await _prepare_collections()
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
         raise e
 
+# Coroutines run by close_db before the client is closed, e.g. to flush buffered writes
+_shutdown_hooks = []
+
+def register_shutdown_hook(hook):
+    """Await ``hook()`` on shutdown while the database is still reachable."""
+    _shutdown_hooks.append(hook)
+
 async def close_db():
-    client.close()
-    sync_client.close() 
\ No newline at end of file
+    for hook in _shutdown_hooks:
+        try:
+            await hook()
+        except Exception as e:
+            logger.error(f"Error in database shutdown hook: {e}")
+    client.close() 
\ No newline at end of file
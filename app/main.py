@@ -1,12 +1,28 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers.auth import router as auth_router
 from app.routers.users import router as users_router
 from app.routers.recommendations import router as recommendations_router
 from app.routers.profiles import router as profiles_router
 from app.routers.swipes import router as swipes_router
-from app.database import init_db, test_connection
+from app.routers.metrics import router as metrics_router
+from app.routers.matches import router as matches_router
+from app.utils.db_stats import DbStatsMiddleware
+from app.utils.metrics import LatencyMiddleware, monitor_event_loop_lag, render_metrics
+from app.utils.profiling import ProfilingMiddleware, PROFILING_TOKEN
+from app.utils.logs import LogContextMiddleware
+from app.utils.swipe_buffer import swipe_buffer, write_behind_enabled
+from app.utils.swipe_counters import apply_counters, reconcile_counters, SWIPE_COUNTERS_RECONCILE_SECONDS
+from app.utils.matches import record_flushed_matches
+from app.utils.cold_start import cold_start, COLD_START_REFRESH_SECONDS
+from app.utils.push import push_hub, PUSH_DIRTY_REFRESH_SECONDS
+from app.utils.dirty_users import dirty_users, DIRTY_USERS_FLUSH_SECONDS
+from app.utils.scheduler import scheduler
+from app.database import init_db, check_connection, close_db, ping, pool_stats, db, register_shutdown_hook
+import asyncio
 import logging
+import os
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,33 +47,124 @@ app.add_middleware(
         "Authorization",
         "Accept",
         "Origin",
-        "X-Requested-With"
+        "X-Requested-With",
+        "If-None-Match",
+        "If-Modified-Since"
     ],
-    expose_headers=["*"],
+    expose_headers=["*", "ETag", "Last-Modified", "X-Next-Cursor", "X-Search-Mode", "X-DB-Stats"],
     max_age=3600
 )
 
+# Attribute MongoDB commands to the route that issued them
+app.add_middleware(DbStatsMiddleware)
+
+# Request path for per-route log sampling
+app.add_middleware(LogContextMiddleware)
+
+# Per-route latency histograms and in-flight gauge for /metrics
+app.add_middleware(LatencyMiddleware)
+
+# On-demand request profiling, only installed when a token is configured
+if PROFILING_TOKEN:
+    app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/api", tags=["auth"])
 app.include_router(users_router, prefix="/api", tags=["users"])
 app.include_router(recommendations_router, prefix="/api", tags=["recommendations"])
 app.include_router(profiles_router, prefix="/api", tags=["profiles"])
 app.include_router(swipes_router, prefix="/api", tags=["swipes"])
+app.include_router(matches_router, prefix="/api", tags=["matches"])
+app.include_router(metrics_router, prefix="/api", tags=["metrics"])
+
+_background_tasks = set()
+
+async def on_swipes_flushed(records):
+    """Counters and matches for a batch the write-behind buffer just wrote."""
+    results = await asyncio.gather(
+        apply_counters(db.users, records),
+        record_flushed_matches(db.swipes, db.matches, records),
+        return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Error after flushing buffered swipes: {result}")
+
+async def refresh_dirty_streams():
+    """Refresh the pushed recommendations of this worker's connected users that changed anywhere."""
+    connected = push_hub.connected_users()
+    if connected:
+        # Peeked, not drained: another worker may hold a stream of the same user
+        marks = await dirty_users.peek(db.dirty_users, connected)
+        for user_id, marked_at in marks.items():
+            # Changes this worker already pushed, e.g. its own swipes, need no second recompute
+            if not push_hub.seen_since(user_id, marked_at):
+                push_hub.schedule_refresh(user_id)
+
+# Background jobs; started once the database is reachable
+scheduler.register("cold_start.refresh", lambda: cold_start.refresh(db.users), COLD_START_REFRESH_SECONDS)
+scheduler.register("dirty_users.flush", lambda: dirty_users.flush(db.dirty_users), DIRTY_USERS_FLUSH_SECONDS)
+scheduler.register("push.refresh_dirty", refresh_dirty_streams, PUSH_DIRTY_REFRESH_SECONDS)
+if SWIPE_COUNTERS_RECONCILE_SECONDS > 0:
+    scheduler.register("swipe_counters.reconcile", lambda: reconcile_counters(db),
+                       SWIPE_COUNTERS_RECONCILE_SECONDS, exclusive=True)
 
 @app.on_event("startup")
 async def startup_event():
+    task = asyncio.create_task(monitor_event_loop_lag())
+    _background_tasks.add(task)
+    if write_behind_enabled():
+        # Flushed one last time by close_db on shutdown
+        swipe_buffer.start(db.swipes, on_flush=on_swipes_flushed)
+        register_shutdown_hook(swipe_buffer.stop)
     try:
         # Test MongoDB connection
-        if not test_connection():
+        if not await check_connection():
             logger.error("Failed to connect to MongoDB. Please check your connection settings.")
             return
 
         # Initialize database
         await init_db()
+
+        scheduler.start(leases=db.job_leases)
+        # Marks not yet flushed are written on shutdown
+        register_shutdown_hook(lambda: dirty_users.flush(db.dirty_users))
+
+        # Optionally import the ML stack now instead of on the first request that needs it
+        if os.getenv("ML_WARMUP", "false").lower() == "true":
+            from app.ml.warmup import warm_up
+            await asyncio.to_thread(warm_up)
         logger.info("Application startup complete")
     except Exception as e:
         logger.error(f"Error during startup: {e}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in _background_tasks:
+        task.cancel()
+    push_hub.close()
+    await scheduler.stop()
+    await close_db()
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: pings MongoDB and reports connection pool utilization."""
+    try:
+        await ping()
+        ready = True
+    except Exception:
+        ready = False
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "pool": pool_stats()}
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint, aggregated across workers in multiprocess mode."""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Recommendation System API"} 
\ No newline at end of file
@@ -0,0 +1,21 @@
+"""
+Recommender package.
+
+Attributes are resolved lazily so that ``import app.ml`` does not pull in
+numpy, pandas or scikit-learn.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "ProfileRecommender": "app.ml.recommender",
+    "warm_up": "app.ml.warmup",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
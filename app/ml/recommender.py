@@ -1,10 +1,13 @@
-import numpy as np
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.metrics.pairwise import cosine_similarity
-from typing import List, Dict, Any
-import pandas as pd
+# numpy, pandas and scikit-learn are imported where they are used, so that
+# importing this module (e.g. from a router or CLI script) stays cheap until
+# something is actually scored; see app.ml.warmup to pay the cost up front.
+from typing import TYPE_CHECKING, List, Dict, Any
+from app.utils.logs import get_logger
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = get_logger(__name__)
 
 class ProfileRecommender:
     def __init__(self):
@@ -27,19 +30,30 @@ class ProfileRecommender:
         self.binary_features = ['smoking', 'drinking']
         self.list_features = ['hobbies', 'languages']
         
-        # Initialize transformers
-        self.preprocessor = self._create_preprocessor()
+        # Transformers are created on first use
+        self._preprocessor = None
+
+    @property
+    def preprocessor(self):
+        if self._preprocessor is None:
+            self._preprocessor = self._create_preprocessor()
+        return self._preprocessor
         
     def _create_preprocessor(self):
         """Create a preprocessing pipeline for features"""
+        from sklearn.preprocessing import StandardScaler, OneHotEncoder
+        from sklearn.compose import ColumnTransformer
+
         transformers = [
             ('num', StandardScaler(), self.numerical_features),
             ('cat', OneHotEncoder(handle_unknown='ignore'), self.categorical_features)
         ]
         return ColumnTransformer(transformers, remainder='drop')
     
-    def _preprocess_list_features(self, profiles: List[Dict[str, Any]]) -> np.ndarray:
+    def _preprocess_list_features(self, profiles: List[Dict[str, Any]]) -> "np.ndarray":
         """Convert list features (hobbies, languages) into binary vectors"""
+        import numpy as np
+
         # Get all unique values for list features
         all_hobbies = set()
         all_languages = set()
@@ -74,6 +88,10 @@ class ProfileRecommender:
         """Get recommendations based on liked profiles"""
         if not liked_profiles or not candidate_profiles:
             return []
+
+        import numpy as np
+        import pandas as pd
+        from sklearn.metrics.pairwise import cosine_similarity
         
         liked_df = pd.DataFrame(liked_profiles)
         candidate_df = pd.DataFrame(candidate_profiles)
@@ -148,8 +166,7 @@ class ProfileRecommender:
             candidate_lists
         ])
         
-        print(f"Liked combined shape: {liked_combined.shape}")
-        print(f"Candidate combined shape: {candidate_combined.shape}")
+        logger.debug("recommender.shapes", liked=liked_combined.shape, candidates=candidate_combined.shape)
         
         avg_liked_profile = np.mean(liked_combined, axis=0).reshape(1, -1)
         
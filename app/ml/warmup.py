@@ -0,0 +1,73 @@
+"""
+Warm-up and startup-time report for the ML stack.
+
+The recommender modules import numpy, pandas and scikit-learn lazily. Call
+``warm_up()`` (or run ``python -m app.ml.warmup``) to pay that cost at a
+chosen moment, e.g. before forking workers, and get a per-step breakdown of
+the time and memory it took.
+"""
+
+import importlib
+import logging
+import sys
+import time
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# In dependency order, so each step only accounts for what it adds
+HEAVY_MODULES = [
+    "numpy",
+    "pandas",
+    "sklearn",
+    "sklearn.preprocessing",
+    "sklearn.compose",
+    "sklearn.metrics.pairwise",
+]
+
+
+def _max_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes on Linux
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _measure(report: List[Dict], step: str, fn) -> None:
+    rss_before = _max_rss_mb()
+    start = time.perf_counter()
+    fn()
+    report.append({
+        "step": step,
+        "seconds": round(time.perf_counter() - start, 4),
+        "peak_rss_mb_delta": round(_max_rss_mb() - rss_before, 1),
+    })
+
+
+def warm_up() -> List[Dict]:
+    """Import the heavy ML modules and build the recommender's transformers, timing each step."""
+    report: List[Dict] = []
+    for name in HEAVY_MODULES:
+        step = f"import {name}" + (" (already loaded)" if name in sys.modules else "")
+        _measure(report, step, lambda name=name: importlib.import_module(name))
+
+    def init_recommender():
+        from app.ml.recommender import ProfileRecommender
+        ProfileRecommender().preprocessor
+
+    _measure(report, "init ProfileRecommender", init_recommender)
+
+    total = sum(item["seconds"] for item in report)
+    logger.info("ML warm-up finished in %.3fs: %s", total,
+                ", ".join(f"{item['step']}={item['seconds']:.3f}s" for item in report))
+    return report
+
+
+if __name__ == "__main__":
+    print(f"{'step':<45}{'seconds':>10}{'peak RSS +MB':>15}")
+    for item in warm_up():
+        print(f"{item['step']:<45}{item['seconds']:>10.4f}{item['peak_rss_mb_delta']:>15.1f}")
@@ -3,4 +3,5 @@ from .auth import router as auth_router
 from .users import router as users_router
 from .recommendations import router as recommendations_router
 from .profiles import router as profiles_router
-from .swipes import router as swipes_router 
\ No newline at end of file
+from .swipes import router as swipes_router
+from .metrics import router as metrics_router
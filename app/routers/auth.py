@@ -5,7 +5,13 @@ from jose.exceptions import JWTError
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from typing import Optional
-from app.database import client
+import time
+from app.database import get_db
+from app.utils.user_cache import user_claims
+from app.utils.admission import busy_response
+from app.utils.password_pool import password_pool, PoolSaturatedError, PASSWORD_HASH_RETRY_AFTER
+from app.utils.cache import TTLCache
+from app.utils.logs import get_logger
 from bson import ObjectId
 import os
 from dotenv import load_dotenv
@@ -13,6 +19,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 router = APIRouter()
+logger = get_logger(__name__)
 
 # Security
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -22,12 +29,33 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Verified token payloads, keyed by the raw token. Entries expire at the
+# token's own "exp" claim (wall clock), so a cached token is never accepted
+# after jose would have rejected it.
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+token_cache = TTLCache(
+    max_size=TOKEN_CACHE_MAX_SIZE,
+    ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    clock=time.time,
+)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password, hashed_password):
+    """Verify a password on the hashing pool instead of the event loop."""
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """Hash a password on the hashing pool instead of the event loop."""
+    return await password_pool.run(get_password_hash, password)
+
+def password_pool_busy_exception():
+    return busy_response(PASSWORD_HASH_RETRY_AFTER)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -38,24 +66,35 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> dict:
+    """
+    Verify ``token`` and return its claims, using the token cache.
+
+    Raises JWTError exactly like ``jwt.decode`` for invalid or expired tokens.
+    """
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        exp = payload.get("exp")
+        token_cache.set(token, payload, expires_at=float(exp) if exp is not None else None)
+    return dict(payload)
+
 @router.post("/token")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(get_db)):
     try:
-        print(f"Login attempt for user: {form_data.username}")
-        db = client['recommendation_system']
         users = db['users']
         
         user = await users.find_one({"email": form_data.username})
         if not user:
-            print(f"User not found: {form_data.username}")
+            logger.warning("login.unknown_user", username=form_data.username)
             raise HTTPException(
                 status_code=401,
                 detail="Incorrect email or password",
                 headers={"WWW-Authenticate": "Bearer"},
             )
             
-        if not verify_password(form_data.password, user["password"]):
-            print(f"Invalid password for user: {form_data.username}")
+        if not await verify_password_async(form_data.password, user["password"]):
+            logger.warning("login.bad_password", username=form_data.username)
             raise HTTPException(
                 status_code=401,
                 detail="Incorrect email or password",
@@ -64,11 +103,15 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
-            data={"sub": str(user["_id"])}, expires_delta=access_token_expires
+            data={"sub": str(user["_id"]), **user_claims(user)}, expires_delta=access_token_expires
         )
         
-        print(f"Login successful for user: {form_data.username}")
+        logger.info("login.success", user_id=user["_id"])
         return {"access_token": access_token, "token_type": "bearer"}
+    except HTTPException as he:
+        raise he
+    except PoolSaturatedError:
+        raise password_pool_busy_exception()
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.exception("login.error", error=e)
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
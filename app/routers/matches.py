@@ -0,0 +1,67 @@
+from fastapi import APIRouter, HTTPException, Query, Depends, Response
+from typing import Optional
+from bson import ObjectId
+from app.database import get_db
+from app.routers.profiles import get_current_principal, clean_profile
+from app.utils.logs import get_logger
+from app.utils.matches import MATCH_SORT, user_matches_query
+from app.utils.pagination import apply_cursor, next_cursor, InvalidCursorError
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+# Fields of the matched user returned with each match
+MATCH_PROFILE_PROJECTION = {
+    "name": 1,
+    "age": 1,
+    "gender": 1,
+    "location": 1,
+    "profession": 1,
+    "profile_image": 1
+}
+
+@router.get("/matches")
+async def get_matches(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_principal),
+    db = Depends(get_db)
+):
+    """
+    List the current user's mutual matches, newest first. Pass the
+    X-Next-Cursor response header back as ``cursor`` for the next page.
+    """
+    try:
+        matches = db['matches']
+        users = db['users']
+        user_id = ObjectId(str(current_user["_id"]))
+
+        query = apply_cursor(user_matches_query(user_id), cursor, MATCH_SORT)
+        page = await matches.find(query).sort(MATCH_SORT).limit(limit).to_list(length=None)
+
+        next_token = next_cursor(page, limit, MATCH_SORT)
+        if next_token:
+            response.headers["X-Next-Cursor"] = next_token
+
+        other_ids = [m["user2_id"] if m["user1_id"] == user_id else m["user1_id"] for m in page]
+        profiles = {
+            profile["_id"]: profile
+            for profile in await users.find({"_id": {"$in": other_ids}}, MATCH_PROFILE_PROJECTION).to_list(length=None)
+        }
+
+        return [
+            {
+                "_id": str(match["_id"]),
+                "user_id": str(other_id),
+                "created_at": match["created_at"].isoformat() if match.get("created_at") else None,
+                "profile": clean_profile(profiles[other_id]) if other_id in profiles else None
+            }
+            for match, other_id in zip(page, other_ids)
+        ]
+
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception("matches.error", error=e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,58 @@
+from fastapi import APIRouter
+from app.routers.auth import token_cache
+from app.utils.user_cache import user_cache
+from app.utils.password_pool import password_pool
+from app.utils.swipe_buffer import swipe_buffer
+from app.utils.cold_start import cold_start
+from app.utils.single_flight import single_flight
+from app.routers.profiles import recommended_admission, next_profile_admission
+from app.utils.push import push_hub
+from app.utils.scheduler import scheduler
+from app.utils.dirty_users import dirty_users
+from app.database import pool_stats
+from app.utils.db_stats import route_db_stats
+
+router = APIRouter()
+
+@router.get("/metrics/caches")
+async def get_cache_metrics():
+    """Hit/miss counters for the in-process caches, the password pool and the swipe buffer."""
+    return {
+        "token_cache": token_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "password_pool": password_pool.stats(),
+        "swipe_buffer": swipe_buffer.stats(),
+        "cold_start": cold_start.stats(),
+        "single_flight": single_flight.stats()
+    }
+
+@router.get("/metrics/admission")
+async def get_admission_metrics():
+    """Concurrency, queue depth and rejections of the admission-controlled endpoints."""
+    return {
+        "recommended": recommended_admission.stats(),
+        "next_profile": next_profile_admission.stats()
+    }
+
+@router.get("/metrics/push")
+async def get_push_metrics():
+    """Connected recommendation streams and the events pushed to them."""
+    return push_hub.stats()
+
+@router.get("/metrics/jobs")
+async def get_job_metrics():
+    """Background job runs, failures and durations in this worker, plus the dirty-user set."""
+    return {**scheduler.stats(), "dirty_users": dirty_users.stats()}
+
+@router.get("/metrics/db-pool")
+async def get_db_pool_metrics():
+    """MongoDB connection pool configuration and utilization."""
+    return pool_stats()
+
+@router.get("/metrics/db")
+async def get_db_metrics(reset: bool = False):
+    """MongoDB commands, round-trips, documents and time per route since start (or the last reset)."""
+    routes = route_db_stats.snapshot()
+    if reset:
+        route_db_stats.reset()
+    return routes
@@ -1,12 +1,31 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from app.database import client
-from app.schemas import ProfileResponse
-from app.routers.auth import oauth2_scheme
+from app.database import get_db
+from app.schemas import ProfileResponse, UserUpdate
+from app.routers.auth import oauth2_scheme, decode_access_token
+from app.utils.logs import get_logger
+from app.utils.user_cache import get_user_by_id, invalidate_user, principal_from_claims
+from app.utils.search_keys import normalize_key
+from app.utils.swipe_buffer import swipe_buffer
+from app.utils.cold_start import cold_start
+from app.utils.single_flight import single_flight, swipe_versions
+from app.utils.cache import TTLCache
+from app.utils.push import push_hub, PUSH_KEEPALIVE_SECONDS
+from app.utils.dirty_users import dirty_users
+from app.utils.admission import (
+    AdmissionController, AdmissionRejectedError, DeadlineExceededError, busy_response, deadline, max_time_ms,
+    mongo_time_limit
+)
+from app.utils.conditional import (
+    VALIDATOR_PROJECTION, document_validators, is_conditional, is_not_modified, not_modified, set_validators
+)
 import math
+import json
+import asyncio
 from typing import Optional
-from jose import jwt
 from jose.exceptions import JWTError
+from pymongo.errors import ExecutionTimeout
 from datetime import datetime
 import os
 from dotenv import load_dotenv
@@ -14,14 +33,42 @@ import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 load_dotenv()
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
-ALGORITHM = "HS256"
 
 router = APIRouter()
 
+# Concurrency limits, wait queues and deadlines for the expensive endpoints
+RECOMMENDED_CONCURRENCY = int(os.getenv("RECOMMENDED_CONCURRENCY", "8"))
+RECOMMENDED_QUEUE = int(os.getenv("RECOMMENDED_QUEUE", "32"))
+RECOMMENDED_DEADLINE_MS = int(os.getenv("RECOMMENDED_DEADLINE_MS", "2000"))
+NEXT_PROFILE_CONCURRENCY = int(os.getenv("NEXT_PROFILE_CONCURRENCY", "32"))
+NEXT_PROFILE_QUEUE = int(os.getenv("NEXT_PROFILE_QUEUE", "128"))
+NEXT_PROFILE_DEADLINE_MS = int(os.getenv("NEXT_PROFILE_DEADLINE_MS", "1000"))
+OVERLOAD_RETRY_AFTER = int(os.getenv("OVERLOAD_RETRY_AFTER", "1"))
+
+recommended_admission = AdmissionController("recommended", RECOMMENDED_CONCURRENCY, RECOMMENDED_QUEUE)
+next_profile_admission = AdmissionController("next_profile", NEXT_PROFILE_CONCURRENCY, NEXT_PROFILE_QUEUE)
+
+# Last good /profiles/recommended response per user, served when a new one misses its deadline
+recommended_cache = TTLCache(
+    max_size=int(os.getenv("RECOMMENDED_CACHE_MAX_SIZE", "10000")),
+    ttl=float(os.getenv("RECOMMENDED_CACHE_TTL_SECONDS", "600"))
+)
+# Ids (as strings) each user had swiped when last read, plus swipes made on this
+# worker since; the degraded answer is filtered with it
+recommended_swiped = TTLCache(max_size=recommended_cache.max_size, ttl=recommended_cache.ttl)
+
+def remember_swiped(user_id, swiped_ids) -> None:
+    """Add new swipes of ``user_id`` to the set the degraded answer is filtered with."""
+    swiped = recommended_swiped.get(str(user_id))
+    if swiped is not None:
+        swiped.update(str(swiped_id) for swiped_id in swiped_ids)
+
+def overloaded_exception():
+    return busy_response(OVERLOAD_RETRY_AFTER)
+
 def clean_profile(profile: dict) -> dict:
     """Clean profile data by removing NaN values and converting ObjectId to string."""
     cleaned = {}
@@ -32,16 +79,15 @@ def clean_profile(profile: dict) -> dict:
             cleaned[key] = str(value) if isinstance(value, ObjectId) else value
     return cleaned
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication token")
         
-        db = client['recommendation_system']
         users = db['users']
-        user = await users.find_one({"_id": ObjectId(user_id)})
+        user = await get_user_by_id(users, user_id)
         
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
@@ -49,10 +95,30 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         return user
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication token")
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        logger.error(f"Error in get_current_user: {str(e)}")
+        logger.error("get_current_user.error", error=e)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_current_principal(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
+    """
+    Return the fields the swipe and recommendation endpoints filter on.
+
+    With AUTH_USER_SOURCE=claims these come straight from the token and no
+    database lookup is made; otherwise this is the full user document.
+    """
+    try:
+        payload = decode_access_token(token)
+        if payload.get("sub") is None:
+            raise HTTPException(status_code=401, detail="Invalid authentication token")
+        principal = principal_from_claims(payload)
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid authentication token")
+    if principal is not None:
+        return principal
+    return await get_current_user(token, db)
+
 @router.get("/profiles/me")
 async def get_my_profile(current_user = Depends(get_current_user)):
     """Get the current user's profile."""
@@ -61,322 +127,495 @@ async def get_my_profile(current_user = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/profiles/recommended")
-async def get_recommended_profiles(current_user: dict = Depends(get_current_user)):
-    """Get recommended profiles based on user's liked profiles."""
+@router.put("/profiles/me")
+async def update_my_profile(profile: UserUpdate, current_user = Depends(get_current_user), db = Depends(get_db)):
+    """Update the current user's profile."""
     try:
-        current_user_id = str(current_user.get('_id'))
-        logger.info(f"Fetching recommended profiles for user: {current_user_id}")
-        
-        db = client['recommendation_system']
         users = db['users']
-        swipes = db['swipes']
-        
-        # Get user's liked profiles
-        swipes_query = {
-            "swiper_id": ObjectId(current_user_id),
-            "liked": True
-        }
-        logger.info(f"Fetching liked profiles with query: {swipes_query}")
-        
-        liked_profiles = await swipes.find(swipes_query).to_list(length=None)
-        num_likes = len(liked_profiles)
-        logger.info(f"Found {num_likes} liked profiles")
-        
-        # Return early if no likes yet
-        if num_likes == 0:
+
+        update_data = profile.model_dump(exclude_unset=True)
+        if update_data.get("location") is not None:
+            update_data["location_key"] = normalize_key(update_data["location"])
+        update_data["updated_at"] = datetime.utcnow()
+
+        updated_user = await users.find_one_and_update(
+            {"_id": current_user["_id"]},
+            {"$set": update_data},
+            return_document=True
+        )
+        invalidate_user(current_user["_id"])
+        dirty_users.mark(current_user["_id"])
+        if updated_user is None:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        return clean_profile(updated_user)
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _compute_recommended(current_user: dict, db):
+    """Build the /profiles/recommended response for ``current_user``."""
+    current_user_id = str(current_user.get('_id'))
+    logger.info("recommended.start", user_id=current_user_id)
+    
+    users = db['users']
+    swipes = db['swipes']
+    
+    # All of the user's swipes in one read; likes are the subset with liked=True
+    swiped = {
+        swipe["swiped_id"]: swipe["liked"]
+        async for swipe in swipes.find(
+            {"swiper_id": ObjectId(current_user_id)},
+            {"_id": 0, "swiped_id": 1, "liked": 1}
+        ).max_time_ms(max_time_ms())
+    }
+    # Swipes still waiting in the write-behind buffer count as well
+    swiped.update(swipe_buffer.pending_for(ObjectId(current_user_id)))
+    recommended_swiped.set(current_user_id, {str(swiped_id) for swiped_id in swiped})
+    liked_profile_ids = [swiped_id for swiped_id, liked in swiped.items() if liked]
+    all_swiped_ids = list(swiped)
+    num_likes = len(liked_profile_ids)
+    logger.debug("recommended.likes", count=num_likes, swiped=len(all_swiped_ids))
+    
+    # No likes yet: serve the precomputed cold-start list for the user's segment
+    if num_likes == 0:
+        cold_profiles = cold_start.recommend(
+            current_user.get('preferred_gender'),
+            current_user.get('age'),
+            exclude_ids=all_swiped_ids + [current_user_id]
+        )
+        logger.info("recommended.cold_start", user_id=current_user_id, returned=len(cold_profiles))
+        if cold_profiles:
             return {
                 "status": "success",
-                "message": "Please swipe right on a few profiles to get personalized recommendations",
+                "message": "Popular profiles to get you started; swipe right on a few for personalized recommendations",
                 "data": {
-                    "profiles": []
+                    "profiles": [clean_profile(profile) for profile in cold_profiles]
                 }
             }
-        
-        # Get all swiped profiles (both liked and disliked)
-        all_swiped = await swipes.find({"swiper_id": ObjectId(current_user_id)}).to_list(length=None)
-        all_swiped_ids = [ObjectId(swipe["swiped_id"]) for swipe in all_swiped]
-        logger.info(f"Total swiped profiles: {len(all_swiped_ids)}")
-        
-        # Build base query
-        base_query = {
-            "_id": {
-                "$ne": ObjectId(current_user_id),  # Exclude current user
-                "$nin": all_swiped_ids  # Exclude swiped profiles
+        return {
+            "status": "success",
+            "message": "Please swipe right on a few profiles to get personalized recommendations",
+            "data": {
+                "profiles": []
             }
         }
-        
-        # Add preferred gender filter
-        preferred_gender = current_user.get('preferred_gender')
-        if preferred_gender and isinstance(preferred_gender, str):
-            preferred_gender = preferred_gender.lower()
-            if preferred_gender != 'other':
-                base_query["gender"] = {"$regex": f"^{preferred_gender}$", "$options": "i"}
-        
-        # Get the profiles that the user has liked
-        liked_profile_ids = [ObjectId(swipe["swiped_id"]) for swipe in liked_profiles]
-        liked_profiles_data = await users.find({"_id": {"$in": liked_profile_ids}}).to_list(length=None)
-        
-        # Extract characteristics from liked profiles with weights
-        feature_weights = {
-            "location": 3,        # High weight for location match
-            "age": 2.5,          # High weight for age match
-            "education_level": 2, # Medium-high weight for education
-            "profession": 2,      # Medium-high weight for profession
-            "hobbies": 1.5,      # Medium weight for hobbies
-            "languages": 1.5,     # Medium weight for languages
-            "religion": 1         # Lower weight for religion
+    
+    # Build base query
+    base_query = {
+        "_id": {
+            "$ne": ObjectId(current_user_id),  # Exclude current user
+            "$nin": all_swiped_ids  # Exclude swiped profiles
         }
-        
-        # Extract unique values for each feature
-        locations = list(set([p.get("location") for p in liked_profiles_data if p.get("location")]))
-        education_levels = list(set([p.get("education_level") for p in liked_profiles_data if p.get("education_level")]))
-        professions = list(set([p.get("profession") for p in liked_profiles_data if p.get("profession")]))
-        religions = list(set([p.get("religion") for p in liked_profiles_data if p.get("religion")]))
-        
-        # Handle hobbies and languages as arrays or comma-separated strings
-        hobbies = []
-        languages = []
-        for p in liked_profiles_data:
-            if p.get("hobbies"):
-                if isinstance(p["hobbies"], list):
-                    hobbies.extend(p["hobbies"])
-                else:
-                    hobbies.extend([h.strip() for h in str(p["hobbies"]).split(",")])
-            if p.get("languages"):
-                if isinstance(p["languages"], list):
-                    languages.extend(p["languages"])
-                else:
-                    languages.extend([l.strip() for l in str(p["languages"]).split(",")])
-        
-        hobbies = list(set(hobbies))
-        languages = list(set(languages))
-        
-        # Calculate age range based on liked profiles
-        ages = [p.get("age") for p in liked_profiles_data if p.get("age")]
-        if ages:
-            avg_age = sum(ages) / len(ages)
-            age_range = 5  # Configurable range
-            min_age = max(18, int(avg_age - age_range))
-            max_age = int(avg_age + age_range)
-        else:
-            min_age = max(18, current_user.get('age', 18) - 5)
-            max_age = current_user.get('age', 40) + 5
-        
-        # Use aggregation pipeline for weighted scoring
-        pipeline = [
-            {"$match": base_query},
-            {"$addFields": {
-                "hobbiesArray": {
-                    "$cond": {
-                        "if": {"$isArray": "$hobbies"},
-                        "then": "$hobbies",
-                        "else": {
-                            "$cond": {
-                                "if": {"$eq": [{"$type": "$hobbies"}, "string"]},
-                                "then": {"$split": ["$hobbies", ","]},
-                                "else": []
-                            }
+    }
+    
+    # Add preferred gender filter
+    preferred_gender = current_user.get('preferred_gender')
+    if preferred_gender and isinstance(preferred_gender, str):
+        preferred_gender = preferred_gender.lower()
+        if preferred_gender != 'other':
+            base_query["gender"] = {"$regex": f"^{preferred_gender}$", "$options": "i"}
+    
+    # Get the profiles that the user has liked
+    liked_profiles_data = await users.find({"_id": {"$in": liked_profile_ids}}).max_time_ms(max_time_ms()).to_list(length=None)
+    
+    # Extract characteristics from liked profiles with weights
+    feature_weights = {
+        "location": 3,        # High weight for location match
+        "age": 2.5,          # High weight for age match
+        "education_level": 2, # Medium-high weight for education
+        "profession": 2,      # Medium-high weight for profession
+        "hobbies": 1.5,      # Medium weight for hobbies
+        "languages": 1.5,     # Medium weight for languages
+        "religion": 1         # Lower weight for religion
+    }
+    
+    # Extract unique values for each feature
+    locations = list(set([p.get("location") for p in liked_profiles_data if p.get("location")]))
+    education_levels = list(set([p.get("education_level") for p in liked_profiles_data if p.get("education_level")]))
+    professions = list(set([p.get("profession") for p in liked_profiles_data if p.get("profession")]))
+    religions = list(set([p.get("religion") for p in liked_profiles_data if p.get("religion")]))
+    
+    # Handle hobbies and languages as arrays or comma-separated strings
+    hobbies = []
+    languages = []
+    for p in liked_profiles_data:
+        if p.get("hobbies"):
+            if isinstance(p["hobbies"], list):
+                hobbies.extend(p["hobbies"])
+            else:
+                hobbies.extend([h.strip() for h in str(p["hobbies"]).split(",")])
+        if p.get("languages"):
+            if isinstance(p["languages"], list):
+                languages.extend(p["languages"])
+            else:
+                languages.extend([l.strip() for l in str(p["languages"]).split(",")])
+    
+    hobbies = list(set(hobbies))
+    languages = list(set(languages))
+    
+    # Calculate age range based on liked profiles
+    ages = [p.get("age") for p in liked_profiles_data if p.get("age")]
+    if ages:
+        avg_age = sum(ages) / len(ages)
+        age_range = 5  # Configurable range
+        min_age = max(18, int(avg_age - age_range))
+        max_age = int(avg_age + age_range)
+    else:
+        min_age = max(18, current_user.get('age', 18) - 5)
+        max_age = current_user.get('age', 40) + 5
+    
+    # Use aggregation pipeline for weighted scoring
+    pipeline = [
+        {"$match": base_query},
+        {"$addFields": {
+            "hobbiesArray": {
+                "$cond": {
+                    "if": {"$isArray": "$hobbies"},
+                    "then": "$hobbies",
+                    "else": {
+                        "$cond": {
+                            "if": {"$eq": [{"$type": "$hobbies"}, "string"]},
+                            "then": {"$split": ["$hobbies", ","]},
+                            "else": []
                         }
                     }
-                },
-                "languagesArray": {
-                    "$cond": {
-                        "if": {"$isArray": "$languages"},
-                        "then": "$languages",
-                        "else": {
-                            "$cond": {
-                                "if": {"$eq": [{"$type": "$languages"}, "string"]},
-                                "then": {"$split": ["$languages", ","]},
-                                "else": []
-                            }
+                }
+            },
+            "languagesArray": {
+                "$cond": {
+                    "if": {"$isArray": "$languages"},
+                    "then": "$languages",
+                    "else": {
+                        "$cond": {
+                            "if": {"$eq": [{"$type": "$languages"}, "string"]},
+                            "then": {"$split": ["$languages", ","]},
+                            "else": []
                         }
                     }
                 }
-            }},
-            {"$addFields": {
-                "score": {
-                    "$sum": [
-                        # Location score
-                        {"$multiply": [
-                            {"$cond": [{"$in": ["$location", locations]}, 1, 0]},
-                            feature_weights["location"]
-                        ]},
-                        # Age score
-                        {"$multiply": [
-                            {"$cond": [
-                                {"$and": [
-                                    {"$gte": ["$age", min_age]},
-                                    {"$lte": ["$age", max_age]}
-                                ]},
-                                1,
-                                0
+            }
+        }},
+        {"$addFields": {
+            "score": {
+                "$sum": [
+                    # Location score
+                    {"$multiply": [
+                        {"$cond": [{"$in": ["$location", locations]}, 1, 0]},
+                        feature_weights["location"]
+                    ]},
+                    # Age score
+                    {"$multiply": [
+                        {"$cond": [
+                            {"$and": [
+                                {"$gte": ["$age", min_age]},
+                                {"$lte": ["$age", max_age]}
                             ]},
-                            feature_weights["age"]
-                        ]},
-                        # Education score
-                        {"$multiply": [
-                            {"$cond": [{"$in": ["$education_level", education_levels]}, 1, 0]},
-                            feature_weights["education_level"]
+                            1,
+                            0
                         ]},
-                        # Profession score
-                        {"$multiply": [
-                            {"$cond": [{"$in": ["$profession", professions]}, 1, 0]},
-                            feature_weights["profession"]
+                        feature_weights["age"]
+                    ]},
+                    # Education score
+                    {"$multiply": [
+                        {"$cond": [{"$in": ["$education_level", education_levels]}, 1, 0]},
+                        feature_weights["education_level"]
+                    ]},
+                    # Profession score
+                    {"$multiply": [
+                        {"$cond": [{"$in": ["$profession", professions]}, 1, 0]},
+                        feature_weights["profession"]
+                    ]},
+                    # Religion score
+                    {"$multiply": [
+                        {"$cond": [{"$in": ["$religion", religions]}, 1, 0]},
+                        feature_weights["religion"]
+                    ]},
+                    # Hobbies score (partial matches count)
+                    {"$multiply": [
+                        {"$divide": [
+                            {"$size": {"$ifNull": [{"$setIntersection": ["$hobbiesArray", hobbies]}, []]}},
+                            {"$max": [1, {"$size": {"$literal": hobbies}}]}
                         ]},
-                        # Religion score
-                        {"$multiply": [
-                            {"$cond": [{"$in": ["$religion", religions]}, 1, 0]},
-                            feature_weights["religion"]
+                        feature_weights["hobbies"]
+                    ]},
+                    # Languages score (partial matches count)
+                    {"$multiply": [
+                        {"$divide": [
+                            {"$size": {"$ifNull": [{"$setIntersection": ["$languagesArray", languages]}, []]}},
+                            {"$max": [1, {"$size": {"$literal": languages}}]}
                         ]},
-                        # Hobbies score (partial matches count)
-                        {"$multiply": [
-                            {"$divide": [
-                                {"$size": {"$ifNull": [{"$setIntersection": ["$hobbiesArray", hobbies]}, []]}},
-                                {"$max": [1, {"$size": {"$literal": hobbies}}]}
-                            ]},
-                            feature_weights["hobbies"]
-                        ]},
-                        # Languages score (partial matches count)
-                        {"$multiply": [
-                            {"$divide": [
-                                {"$size": {"$ifNull": [{"$setIntersection": ["$languagesArray", languages]}, []]}},
-                                {"$max": [1, {"$size": {"$literal": languages}}]}
-                            ]},
-                            feature_weights["languages"]
-                        ]}
-                    ]
-                }
-            }},
-            {"$sort": {"score": -1}},
-            {"$limit": 10}  # Return top 10 matches
-        ]
-        
-        recommended_profiles = await users.aggregate(pipeline).to_list(length=None)
-        
-        # Clean and return the profiles
-        if recommended_profiles:
-            cleaned_profiles = [clean_profile(profile) for profile in recommended_profiles]
-            logger.info(f"Returning {len(cleaned_profiles)} recommended profiles")
-            return {
-                "status": "success",
-                "message": "Here are your personalized recommendations based on your likes",
-                "data": {
-                    "profiles": cleaned_profiles
-                }
+                        feature_weights["languages"]
+                    ]}
+                ]
             }
-        else:
-            logger.info("No recommendations found")
-            return {
-                "status": "success",
-                "message": "No matching recommendations found at this time",
-                "data": {
-                    "profiles": []
-                }
+        }},
+        {"$sort": {"score": -1}},
+        {"$limit": 10}  # Return top 10 matches
+    ]
+    
+    recommended_profiles = await users.aggregate(pipeline, **mongo_time_limit()).to_list(length=None)
+    
+    # Clean and return the profiles
+    if recommended_profiles:
+        cleaned_profiles = [clean_profile(profile) for profile in recommended_profiles]
+        logger.info("recommended.done", user_id=current_user_id, returned=len(cleaned_profiles))
+        return {
+            "status": "success",
+            "message": "Here are your personalized recommendations based on your likes",
+            "data": {
+                "profiles": cleaned_profiles
             }
-            
+        }
+    else:
+        logger.info("recommended.done", user_id=current_user_id, returned=0)
+        return {
+            "status": "success",
+            "message": "No matching recommendations found at this time",
+            "data": {
+                "profiles": []
+            }
+        }
+
+async def _admitted_recommended(current_user: dict, db):
+    async with recommended_admission.admit():
+        return await _compute_recommended(current_user, db)
+
+def _degraded_recommended(current_user: dict) -> dict:
+    """
+    Answer for a request that missed its deadline: the last good result, else
+    cold-start profiles, minus everything the user is known to have swiped.
+    Without a known swiped set there is nothing safe to serve, and it raises 503.
+    """
+    current_user_id = str(current_user.get('_id'))
+    swiped = recommended_swiped.get(current_user_id)
+    if swiped is None:
+        raise overloaded_exception()
+    excluded = swiped | {str(i) for i in swipe_buffer.pending_for(ObjectId(current_user_id))} | {current_user_id}
+
+    cached = recommended_cache.get(current_user_id)
+    if cached is not None:
+        profiles = [profile for profile in cached["data"]["profiles"] if str(profile["_id"]) not in excluded]
+        return {**cached, "degraded": True, "data": {**cached["data"], "profiles": profiles}}
+    cold_profiles = cold_start.recommend(
+        current_user.get('preferred_gender'),
+        current_user.get('age'),
+        exclude_ids=excluded
+    )
+    return {
+        "status": "success",
+        "message": "Popular profiles while personalized recommendations are unavailable",
+        "degraded": True,
+        "data": {
+            "profiles": [clean_profile(profile) for profile in cold_profiles]
+        }
+    }
+
+@router.get("/profiles/recommended")
+async def get_recommended_profiles(current_user: dict = Depends(get_current_principal), db = Depends(get_db)):
+    """
+    Get recommended profiles based on user's liked profiles.
+
+    Concurrent requests from the same user with the same swipes (double
+    submits, several open tabs) share a single computation. At most
+    RECOMMENDED_CONCURRENCY computations run at once; a request that misses
+    its RECOMMENDED_DEADLINE_MS gets the user's last result or cold-start
+    profiles instead, without the profiles they swiped since (or a 503 if
+    their swipes were never read), and one that finds the wait queue full
+    gets a 503.
+    """
+    try:
+        current_user_id = str(current_user.get('_id'))
+        key = ("recommended", current_user_id, swipe_versions.get(current_user_id))
+        with deadline(RECOMMENDED_DEADLINE_MS):
+            result = await asyncio.wait_for(
+                single_flight.do(key, _admitted_recommended, current_user, db),
+                timeout=RECOMMENDED_DEADLINE_MS / 1000 if RECOMMENDED_DEADLINE_MS else None
+            )
+        if result.get("status") == "success":
+            recommended_cache.set(current_user_id, result)
+        return result
+    except AdmissionRejectedError:
+        logger.warning("recommended.rejected", user_id=current_user.get('_id'))
+        raise overloaded_exception()
+    except (DeadlineExceededError, ExecutionTimeout, asyncio.TimeoutError):
+        logger.warning("recommended.deadline", user_id=current_user.get('_id'))
+        return _degraded_recommended(current_user)
     except Exception as e:
-        logger.error(f"Error in get_recommended_profiles: {str(e)}")
-        logger.exception("Full traceback:")
+        logger.exception("recommended.error", error=e)
         return {
             "status": "error",
             "message": "Failed to fetch recommendations",
             "error": str(e)
         }
 
+async def _pick_next_profile(current_user: dict, db):
+    """Draw a random profile the user has not swiped on yet."""
+    logger.info("next_profile.start", user_id=current_user.get('_id'))
+    
+    users = db['users']
+    swipes = db['swipes']
+    
+    # Get user's preferred gender and normalize it safely
+    preferred_gender = current_user.get('preferred_gender')
+    if preferred_gender and isinstance(preferred_gender, str):
+        preferred_gender = preferred_gender.lower()  # Convert to lowercase for consistency
+    
+    # Get IDs of profiles this user has already swiped on
+    try:
+        swiped_profiles = await swipes.distinct(
+            "swiped_id",
+            {"swiper_id": ObjectId(str(current_user["_id"]))},
+            **mongo_time_limit()
+        )
+        logger.debug("next_profile.swiped", count=len(swiped_profiles), ids=swiped_profiles)
+    except (DeadlineExceededError, ExecutionTimeout):
+        raise
+    except Exception as e:
+        logger.error("next_profile.swiped_error", error=e)
+        swiped_profiles = []
+    # Swipes still waiting in the write-behind buffer
+    pending_swipes = swipe_buffer.pending_for(ObjectId(str(current_user["_id"])))
+    if pending_swipes:
+        swiped_profiles = list(set(swiped_profiles) | set(pending_swipes))
+    
+    # Build the base query
+    query = {
+        "_id": {"$ne": ObjectId(str(current_user["_id"]))}  # Exclude current user
+    }
+    
+    # Add gender filter if preferred_gender is specified
+    if preferred_gender and preferred_gender != 'other':
+        query["gender"] = {"$regex": f"^{preferred_gender}$", "$options": "i"}
+    
+    # Add swiped profiles filter
+    if swiped_profiles:
+        query["_id"]["$nin"] = [ObjectId(id) for id in swiped_profiles]
+        
+    # First, count total available profiles
+    total_profiles = await users.count_documents(query, **mongo_time_limit())
+    logger.debug("next_profile.candidates", count=total_profiles, preferred_gender=preferred_gender)
+    
+    if total_profiles == 0:
+        logger.info("next_profile.exhausted", user_id=current_user.get('_id'))
+        raise HTTPException(
+            status_code=404, 
+            detail="No more profiles available matching your preferences"
+        )
+    
+    # Find all matching profiles and get a random one
+    profiles = await users.aggregate([
+        {"$match": query},
+        {"$sample": {"size": 1}}
+    ], **mongo_time_limit()).to_list(length=1)
+    
+    if not profiles:
+        logger.info("next_profile.exhausted", user_id=current_user.get('_id'))
+        raise HTTPException(
+            status_code=404, 
+            detail="No more profiles available matching your preferences"
+        )
+    
+    # Clean and return the profile
+    cleaned_profile = clean_profile(profiles[0])
+    logger.debug("next_profile.done", profile_id=cleaned_profile.get("_id"))
+    return cleaned_profile
+
+async def _admitted_next_profile(current_user: dict, db):
+    async with next_profile_admission.admit():
+        return await _pick_next_profile(current_user, db)
+
 @router.get("/profiles/next")
-async def get_next_profile(current_user: dict = Depends(get_current_user)):
+async def get_next_profile(current_user: dict = Depends(get_current_principal), db = Depends(get_db)):
     try:
-        logger.info(f"Fetching next profile for user: {current_user.get('_id')}")
-        logger.info(f"Current user full data: {current_user}")
-        
-        db = client['recommendation_system']
-        users = db['users']
-        swipes = db['swipes']
-        
-        # Get user's preferred gender and normalize it safely
-        preferred_gender = current_user.get('preferred_gender')
-        if preferred_gender and isinstance(preferred_gender, str):
-            preferred_gender = preferred_gender.lower()  # Convert to lowercase for consistency
-        logger.info(f"Preferred gender (normalized): {preferred_gender}")
-        
-        # Get IDs of profiles this user has already swiped on
-        try:
-            swiped_profiles = await swipes.distinct(
-                "swiped_id",
-                {"swiper_id": ObjectId(str(current_user["_id"]))}
-            )
-            logger.info(f"Swiped profiles: {swiped_profiles}")
-        except Exception as e:
-            logger.error(f"Error getting swiped profiles: {str(e)}")
-            swiped_profiles = []
-        
-        # Build the base query
-        query = {
-            "_id": {"$ne": ObjectId(str(current_user["_id"]))}  # Exclude current user
-        }
-        
-        # Add gender filter if preferred_gender is specified
-        if preferred_gender and preferred_gender != 'other':
-            query["gender"] = {"$regex": f"^{preferred_gender}$", "$options": "i"}
-        
-        # Add swiped profiles filter
-        if swiped_profiles:
-            query["_id"]["$nin"] = [ObjectId(id) for id in swiped_profiles]
-            
-        logger.info(f"Final query: {query}")
-        
-        # First, count total available profiles
-        total_profiles = await users.count_documents(query)
-        logger.info(f"Total available profiles matching criteria: {total_profiles}")
-        
-        if total_profiles == 0:
-            logger.info("No profiles found matching criteria")
-            raise HTTPException(
-                status_code=404, 
-                detail="No more profiles available matching your preferences"
-            )
-        
-        # Find all matching profiles and get a random one
-        profiles = await users.aggregate([
-            {"$match": query},
-            {"$sample": {"size": 1}}
-        ]).to_list(length=1)
-        
-        logger.info(f"Random profile selected: {profiles[0] if profiles else None}")
-        
-        if not profiles:
-            logger.info("No profiles found after aggregation")
-            raise HTTPException(
-                status_code=404, 
-                detail="No more profiles available matching your preferences"
-            )
-        
-        # Clean and return the profile
-        cleaned_profile = clean_profile(profiles[0])
-        logger.info(f"Returning cleaned profile: {cleaned_profile}")
-        return cleaned_profile
-        
+        # A double-fired request gets the same card instead of drawing twice
+        current_user_id = str(current_user["_id"])
+        key = ("next", current_user_id, swipe_versions.get(current_user_id))
+        with deadline(NEXT_PROFILE_DEADLINE_MS):
+            return await single_flight.do(key, _admitted_next_profile, current_user, db)
+    except (AdmissionRejectedError, DeadlineExceededError, ExecutionTimeout):
+        # No safe fallback here: a stale card may already have been swiped
+        logger.warning("next_profile.overloaded", user_id=current_user.get('_id'))
+        raise overloaded_exception()
     except HTTPException as he:
         raise he
     except Exception as e:
-        logger.error(f"Error in get_next_profile: {str(e)}")
-        logger.exception("Full traceback:")
+        logger.exception("next_profile.error", error=e)
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _pushed_recommendations(current_user: dict, db):
+    """Recompute the recommendations of a streaming client, under the same limits as a request."""
+    current_user_id = str(current_user.get('_id'))
+    key = ("recommended", current_user_id, swipe_versions.get(current_user_id))
+    with deadline(RECOMMENDED_DEADLINE_MS):
+        result = await single_flight.do(key, _admitted_recommended, current_user, db)
+    if result.get("status") != "success":
+        return []
+    recommended_cache.set(current_user_id, result)
+    return result["data"]["profiles"]
+
+@router.get("/profiles/stream")
+async def stream_recommendations(request: Request, token: Optional[str] = None, db = Depends(get_db)):
+    """
+    Server-Sent Events stream of recommendation updates for the current user.
+
+    Browsers' EventSource cannot send headers, so the access token may be
+    passed as the ``token`` query parameter instead of a Bearer header. The
+    first ``recommendations`` event carries the full deck; later ones only
+    the profiles added and the ids removed.
+    """
+    if token is None:
+        scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+        token = credentials if scheme.lower() == "bearer" else None
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    current_user = await get_current_principal(token, db)
+    current_user_id = str(current_user["_id"])
+
+    async def events():
+        async with push_hub.subscribe(current_user_id, lambda: _pushed_recommendations(current_user, db)) as queue:
+            # Another connection of the same user may already have built the deck
+            snapshot = push_hub.snapshot(current_user_id)
+            if snapshot is not None:
+                yield f"event: recommendations\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            else:
+                push_hub.schedule_refresh(current_user_id)
+            while not await request.is_disconnected():
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=PUSH_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line, keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # This route must be last to avoid conflicts with other /profiles/* routes
 @router.get("/profiles/{profile_id}")
-async def get_profile(profile_id: str):
+async def get_profile(profile_id: str, request: Request, response: Response, db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         users = db['users']
         
+        if is_conditional(request):
+            stamp = await users.find_one({"_id": ObjectId(profile_id)}, VALIDATOR_PROJECTION)
+            if stamp is not None and is_not_modified(request, document_validators(stamp)):
+                return not_modified(document_validators(stamp))
+
         profile = await users.find_one({"_id": ObjectId(profile_id)})
         if profile is None:
             raise HTTPException(status_code=404, detail="Profile not found")
             
         # Clean and return the profile
+        set_validators(response, document_validators(profile))
         return clean_profile(profile)
         
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
@@ -1,77 +1,309 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from app.schemas import Recommendation, RecommendationCreate, RecommendationUpdate
-from app.database import client
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import Dict, List, Optional
+from app.schemas import (
+    Recommendation, RecommendationCreate, RecommendationUpdate,
+    RecommendationBulkUpdate, RecommendationBulkDelete
+)
+from app.database import get_db
 from bson import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import BulkWriteError
 from datetime import datetime
+import os
 from app.routers.auth import oauth2_scheme
+from app.utils.search_keys import normalize_key, prefix_query
+from app.utils.pagination import apply_cursor, next_cursor, InvalidCursorError
+from app.utils.conditional import (
+    VALIDATOR_PROJECTION, document_validators, list_validators,
+    is_conditional, is_not_modified, not_modified, set_validators
+)
 import logging
 
 router = APIRouter()
 
+# Default for the search_mode parameter: regex | text | prefix | auto
+RECOMMENDATION_SEARCH_MODE = os.getenv("RECOMMENDATION_SEARCH_MODE", "regex")
+
+# Largest number of items accepted by the bulk endpoints in one request
+RECOMMENDATION_BULK_MAX = int(os.getenv("RECOMMENDATION_BULK_MAX", "1000"))
+
+# Orderings available for keyset pagination; each ends in _id so it is total
+RECOMMENDATION_SORTS = {
+    "_id": [("_id", 1)],
+    "rating": [("rating", -1), ("_id", 1)],
+}
+
+def _with_title_key(fields: dict) -> dict:
+    """Keep ``title_key`` in step with ``title`` when it is being written."""
+    if "title" in fields:
+        fields["title_key"] = normalize_key(fields["title"])
+    return fields
+
 @router.post("/recommendations", response_model=Recommendation)
-async def create_recommendation(recommendation: RecommendationCreate):
+async def create_recommendation(recommendation: RecommendationCreate, db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         recommendations = db['recommendations']
         
-        recommendation_dict = recommendation.model_dump()
+        recommendation_dict = _with_title_key(recommendation.model_dump())
         recommendation_dict["created_at"] = datetime.utcnow()
         recommendation_dict["updated_at"] = datetime.utcnow()
         
-        result = await recommendations.insert_one(recommendation_dict)
-        created_recommendation = await recommendations.find_one({"_id": result.inserted_id})
-        return {**created_recommendation, "_id": str(created_recommendation["_id"])}
+        # insert_one fills in _id, so the stored document is already at hand
+        await recommendations.insert_one(recommendation_dict)
+        return {**recommendation_dict, "_id": str(recommendation_dict["_id"])}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _check_bulk_size(items: list):
+    if not items:
+        raise HTTPException(status_code=400, detail="No items given")
+    if len(items) > RECOMMENDATION_BULK_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {RECOMMENDATION_BULK_MAX} items are accepted per request"
+        )
+
+def _parse_object_id(value: str) -> Optional[ObjectId]:
+    return ObjectId(value) if ObjectId.is_valid(value) else None
+
+async def _bulk_write(collection, ops: list) -> Dict[int, str]:
+    """Run ``ops`` as one unordered bulk write and return error messages by op position."""
+    if not ops:
+        return {}
+    try:
+        await collection.bulk_write(ops, ordered=False)
+        return {}
+    except BulkWriteError as e:
+        return {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+
+async def _bulk_apply(collection, ids: List[str], make_op, status: str) -> List[dict]:
+    """
+    Apply one write per id with a single bulk write and report per-item results.
+
+    Ids that are malformed or do not exist are reported without being sent;
+    existence is checked with one indexed ``$in`` query up front because the
+    bulk write result only carries aggregate counts.
+    """
+    object_ids = [_parse_object_id(value) for value in ids]
+    existing = set(await collection.distinct(
+        "_id", {"_id": {"$in": [oid for oid in object_ids if oid is not None]}}
+    ))
+
+    results: List[dict] = []
+    ops = []
+    op_items = []
+    for index, (value, oid) in enumerate(zip(ids, object_ids)):
+        if oid is None:
+            results.append({"index": index, "id": value, "status": "error", "error": "Invalid recommendation ID"})
+        elif oid not in existing:
+            results.append({"index": index, "id": value, "status": "not_found"})
+        else:
+            result = {"index": index, "id": value, "status": status}
+            results.append(result)
+            ops.append(make_op(index, oid))
+            op_items.append(result)
+
+    errors = await _bulk_write(collection, ops)
+    for position, error in errors.items():
+        op_items[position].update({"status": "error", "error": error})
+    return results
+
+@router.post("/recommendations/bulk")
+async def create_recommendations_bulk(items: List[RecommendationCreate], db = Depends(get_db)):
+    """Create many recommendations with one unordered bulk write."""
+    _check_bulk_size(items)
+    try:
+        recommendations = db['recommendations']
+
+        now = datetime.utcnow()
+        documents = [
+            {**_with_title_key(item.model_dump()), "_id": ObjectId(), "created_at": now, "updated_at": now}
+            for item in items
+        ]
+        errors = await _bulk_write(recommendations, [InsertOne(doc) for doc in documents])
+
+        results = []
+        for index, doc in enumerate(documents):
+            if index in errors:
+                results.append({"index": index, "status": "error", "error": errors[index]})
+            else:
+                document = {key: value for key, value in doc.items() if key != "title_key"}
+                results.append({
+                    "index": index,
+                    "status": "created",
+                    "document": {**document, "_id": str(doc["_id"])}
+                })
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.patch("/recommendations/bulk")
+async def update_recommendations_bulk(items: List[RecommendationBulkUpdate], db = Depends(get_db)):
+    """Apply partial updates to many recommendations with one unordered bulk write."""
+    _check_bulk_size(items)
+    try:
+        recommendations = db['recommendations']
+
+        now = datetime.utcnow()
+
+        def make_op(index: int, oid: ObjectId):
+            fields = _with_title_key(items[index].model_dump(exclude_unset=True, exclude={"id"}))
+            fields["updated_at"] = now
+            return UpdateOne({"_id": oid}, {"$set": fields})
+
+        results = await _bulk_apply(recommendations, [item.id for item in items], make_op, "updated")
+        return {"results": results}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/recommendations/bulk")
+async def delete_recommendations_bulk(request: RecommendationBulkDelete, db = Depends(get_db)):
+    """Delete many recommendations with one unordered bulk write."""
+    _check_bulk_size(request.ids)
+    try:
+        recommendations = db['recommendations']
+
+        results = await _bulk_apply(
+            recommendations,
+            request.ids,
+            lambda index, oid: DeleteOne({"_id": oid}),
+            "deleted"
+        )
+        return {"results": results}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/recommendations", response_model=List[Recommendation])
-async def get_recommendations(skip: int = 0, limit: int = 10, search: str = None, category: str = None):
+async def get_recommendations(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 10,
+    search: str = None,
+    category: str = None,
+    cursor: Optional[str] = None,
+    order_by: str = Query("_id", pattern="^(_id|rating)$"),
+    search_mode: str = Query(RECOMMENDATION_SEARCH_MODE, pattern="^(regex|text|prefix|auto)$"),
+    db = Depends(get_db)
+):
+    """
+    List recommendations. Pass the X-Next-Cursor response header back as
+    ``cursor`` to fetch the following page without ``skip``.
+
+    ``search_mode`` selects how ``search`` is matched: "regex" scans title
+    and description for a substring, "text" uses the text index ranked by
+    relevance, "prefix" matches the start of the title (case-insensitively,
+    through the indexed ``title_key``), and "auto" tries
+    "text" first and falls back to "prefix" when no whole word matches.
+
+    Text results are ordered by relevance, which is not a stored field a
+    cursor can seek on, so they are paged with ``skip`` only: ``cursor`` and
+    an ``order_by`` other than "_id" are rejected with 400, and no
+    X-Next-Cursor is sent. The X-Search-Mode response header names the mode
+    that produced the page, which for "auto" may be "prefix".
+    """
     try:
-        db = client['recommendation_system']
         recommendations = db['recommendations']
         
         query = {}
         
+        if category:
+            query["category"] = category
+
+        if search and search_mode in ("text", "auto"):
+            if cursor:
+                raise HTTPException(status_code=400, detail="cursor is not supported for text search, use skip")
+            if order_by != "_id":
+                raise HTTPException(status_code=400, detail="text search is ordered by relevance, order_by is not supported")
+            results = await _text_search(recommendations, search, query, skip, limit)
+            # Only fall back on the first page; an empty later page just means the end
+            if results or search_mode == "text" or skip:
+                validators = list_validators(results)
+                if is_conditional(request) and is_not_modified(request, validators):
+                    return not_modified(validators)
+                set_validators(response, validators)
+                response.headers["X-Search-Mode"] = "text"
+                return results
+            search_mode = "prefix"
         if search:
+            response.headers["X-Search-Mode"] = search_mode
+
+        if search and search_mode == "prefix":
+            query["title_key"] = prefix_query(search)
+        elif search:
             query["$or"] = [
                 {"title": {"$regex": search, "$options": "i"}},
                 {"description": {"$regex": search, "$options": "i"}}
             ]
-        
-        if category:
-            query["category"] = category
 
-        cursor = recommendations.find(query).skip(skip).limit(limit)
-        results = []
-        async for doc in cursor:
+        # Seek past the previous page instead of skipping
+        sort = RECOMMENDATION_SORTS[order_by]
+        query = apply_cursor(query, cursor, sort)
+
+        def page(projection=None):
+            find = recommendations.find(query, projection).sort(sort)
+            if not cursor:
+                find = find.skip(skip)
+            return find.limit(limit)
+
+        # Pollers that already hold this page are answered from an _id/updated_at projection
+        if is_conditional(request):
+            validators = list_validators(await page(VALIDATOR_PROJECTION).to_list(length=None))
+            if is_not_modified(request, validators):
+                return not_modified(validators)
+
+        results = await page().to_list(length=None)
+        set_validators(response, list_validators(results))
+
+        next_token = next_cursor(results, limit, sort)
+        if next_token:
+            response.headers["X-Next-Cursor"] = next_token
+
+        for doc in results:
             doc["_id"] = str(doc["_id"])
-            results.append(doc)
         return results
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _text_search(recommendations, search: str, query: dict, skip: int, limit: int) -> List[dict]:
+    """Run ``search`` against the (title, description) text index, best matches first."""
+    text_query = {**query, "$text": {"$search": search}}
+    score = {"$meta": "textScore"}
+    cursor = recommendations.find(text_query, {"score": score}).sort([("score", score), ("_id", 1)])
+    results = await cursor.skip(skip).limit(limit).to_list(length=None)
+    for doc in results:
+        doc["_id"] = str(doc["_id"])
+    return results
+
 @router.get("/recommendations/{recommendation_id}", response_model=Recommendation)
-async def get_recommendation(recommendation_id: str):
+async def get_recommendation(recommendation_id: str, request: Request, response: Response, db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         recommendations = db['recommendations']
         
+        if is_conditional(request):
+            stamp = await recommendations.find_one({"_id": ObjectId(recommendation_id)}, VALIDATOR_PROJECTION)
+            if stamp is not None and is_not_modified(request, document_validators(stamp)):
+                return not_modified(document_validators(stamp))
+
         result = await recommendations.find_one({"_id": ObjectId(recommendation_id)})
         if result is None:
             raise HTTPException(status_code=404, detail="Recommendation not found")
+        set_validators(response, document_validators(result))
         result["_id"] = str(result["_id"])
         return result
     except Exception as e:
         raise HTTPException(status_code=404, detail="Invalid recommendation ID")
 
 @router.put("/recommendations/{recommendation_id}", response_model=Recommendation)
-async def update_recommendation(recommendation_id: str, recommendation: RecommendationUpdate):
+async def update_recommendation(recommendation_id: str, recommendation: RecommendationUpdate, db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         recommendations = db['recommendations']
         
-        recommendation_dict = recommendation.model_dump(exclude_unset=True)
+        recommendation_dict = _with_title_key(recommendation.model_dump(exclude_unset=True))
         recommendation_dict["updated_at"] = datetime.utcnow()
         
         result = await recommendations.find_one_and_update(
@@ -89,9 +321,8 @@ async def update_recommendation(recommendation_id: str, recommendation: Recommen
         raise HTTPException(status_code=404, detail="Invalid recommendation ID")
 
 @router.delete("/recommendations/{recommendation_id}")
-async def delete_recommendation(recommendation_id: str):
+async def delete_recommendation(recommendation_id: str, db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         recommendations = db['recommendations']
         
         result = await recommendations.delete_one({"_id": ObjectId(recommendation_id)})
@@ -1,28 +1,43 @@
 from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
-from app.database import client
+from pymongo.errors import BulkWriteError
+from app.database import get_db
 from app.schemas import SwipeCreate
 from app.routers.auth import oauth2_scheme
 from datetime import datetime
-from app.routers.profiles import get_current_user
+from app.routers.profiles import get_current_principal, remember_swiped
+from app.utils.user_cache import get_user_by_id
+from app.utils.admission import busy_response
+from app.utils.swipe_buffer import swipe_buffer, BufferFullError, DUPLICATE_KEY, SWIPE_BUFFER_RETRY_AFTER
+from app.utils.matches import record_matches
+from app.utils.swipe_counters import apply_counters
+from app.utils.single_flight import swipe_versions
+from app.utils.push import push_hub
+from app.utils.dirty_users import dirty_users
+from app.utils.logs import get_logger
 from pydantic import BaseModel
+from typing import List
 import logging
+import os
 
 router = APIRouter()
+logger = get_logger(__name__)
+
+# Largest number of swipes accepted by /swipes/batch in one request
+SWIPE_BATCH_MAX = int(os.getenv("SWIPE_BATCH_MAX", "500"))
 
 class SwipeCreate(BaseModel):
     swiped_id: str
     liked: bool
 
 @router.post("/swipes/")
-async def create_swipe(swipe_data: SwipeCreate, current_user: dict = Depends(get_current_user)):
+async def create_swipe(swipe_data: SwipeCreate, current_user: dict = Depends(get_current_principal), db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         swipes = db['swipes']
         users = db['users']
         
         # Validate that the profile exists
-        profile = await users.find_one({"_id": ObjectId(swipe_data.swiped_id)})
+        profile = await get_user_by_id(users, swipe_data.swiped_id)
         if not profile:
             raise HTTPException(status_code=404, detail="Profile not found")
             
@@ -34,18 +49,163 @@ async def create_swipe(swipe_data: SwipeCreate, current_user: dict = Depends(get
             "created_at": datetime.utcnow()
         }
         
-        result = await swipes.insert_one(swipe_record)
+        if swipe_buffer.running:
+            # Write-behind: acknowledged once queued, written by the next batch flush.
+            # The unique index only catches a stored duplicate at flush time, after
+            # this swipe was acknowledged, counted and matched, so check it first
+            if await swipes.find_one(
+                {"swiper_id": swipe_record["swiper_id"], "swiped_id": swipe_record["swiped_id"]},
+                {"_id": 1}
+            ):
+                raise HTTPException(status_code=409, detail="Profile already swiped")
+            try:
+                if not swipe_buffer.add(swipe_record):
+                    raise HTTPException(status_code=409, detail="Profile already swiped")
+            except BufferFullError:
+                raise busy_response(SWIPE_BUFFER_RETRY_AFTER)
+            inserted_id = swipe_record["_id"]
+        else:
+            result = await swipes.insert_one(swipe_record)
+            inserted_id = result.inserted_id
+            # Buffered swipes are counted when their batch is flushed
+            try:
+                await apply_counters(users, [swipe_record])
+            except Exception as e:
+                logger.error("swipe.counter_error", error=e)
+        
+        # Recommendations computed from here on must not reuse ones started before this swipe
+        swipe_versions.bump(swipe_record["swiper_id"])
+        dirty_users.mark(swipe_record["swiper_id"])
+        remember_swiped(swipe_record["swiper_id"], [swipe_record["swiped_id"]])
+        push_hub.swiped(swipe_record["swiper_id"], [(swipe_record["swiped_id"], swipe_record["liked"])])
+        
+        # A like answering an earlier like from the other side is a match
+        matched = False
+        if swipe_record["liked"]:
+            try:
+                matched = bool(await record_matches(
+                    swipes, db['matches'], swipe_record["swiper_id"], [swipe_record["swiped_id"]],
+                    created_at=swipe_record["created_at"]
+                ))
+            except Exception as e:
+                logger.error("swipe.match_error", error=e)
         
         # Convert ObjectId to string for response
         response = {
-            "_id": str(result.inserted_id),
+            "_id": str(inserted_id),
             "swiper_id": str(swipe_record["swiper_id"]),
             "swiped_id": str(swipe_record["swiped_id"]),
             "liked": swipe_record["liked"],
-            "created_at": swipe_record["created_at"].isoformat()
+            "created_at": swipe_record["created_at"].isoformat(),
+            "match": matched
         }
         
         return response
         
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/swipes/batch")
+async def create_swipes_batch(swipes_data: List[SwipeCreate], current_user: dict = Depends(get_current_principal), db = Depends(get_db)):
+    """
+    Record many swipes at once, e.g. an offline queue flushed by a mobile client.
+
+    All swiped ids are validated with one $in query and the swipes are written
+    with one unordered insert_many. Every item gets its own status: "created",
+    "duplicate" (already swiped, still waiting in the write-behind buffer, or
+    repeated in the batch), "not_found" or "error"; a failing item never fails
+    the whole batch.
+    """
+    if not swipes_data:
+        raise HTTPException(status_code=400, detail="No swipes given")
+    if len(swipes_data) > SWIPE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {SWIPE_BATCH_MAX} swipes are accepted per request")
+
+    try:
+        swipes = db['swipes']
+        users = db['users']
+
+        swiper_id = current_user["_id"]
+        swiped_ids = [ObjectId(item.swiped_id) if ObjectId.is_valid(item.swiped_id) else None for item in swipes_data]
+        existing = set(await users.distinct("_id", {"_id": {"$in": [oid for oid in swiped_ids if oid is not None]}}))
+
+        now = datetime.utcnow()
+        results = []
+        records = []
+        record_results = []
+        # Swipes already stored, or acknowledged by the write-behind buffer but
+        # not yet written, count as existing
+        seen = set(swipe_buffer.pending_for(swiper_id))
+        if existing:
+            seen.update(await swipes.distinct(
+                "swiped_id", {"swiper_id": swiper_id, "swiped_id": {"$in": list(existing)}}
+            ))
+        for index, (item, swiped_id) in enumerate(zip(swipes_data, swiped_ids)):
+            result = {"index": index, "swiped_id": item.swiped_id}
+            results.append(result)
+            if swiped_id is None:
+                result.update({"status": "error", "error": "Invalid profile ID"})
+            elif swiped_id not in existing:
+                result["status"] = "not_found"
+            elif swiped_id in seen:
+                result["status"] = "duplicate"
+            else:
+                seen.add(swiped_id)
+                records.append({
+                    "swiper_id": swiper_id,
+                    "swiped_id": swiped_id,
+                    "liked": item.liked,
+                    "created_at": now
+                })
+                record_results.append(result)
+
+        write_errors = {}
+        if records:
+            try:
+                await swipes.insert_many(records, ordered=False)
+            except BulkWriteError as e:
+                write_errors = {err["index"]: err for err in e.details.get("writeErrors", [])}
+
+        for position, (record, result) in enumerate(zip(records, record_results)):
+            error = write_errors.get(position)
+            if error is None:
+                result.update({"status": "created", "_id": str(record["_id"]), "liked": record["liked"]})
+            elif error.get("code") == DUPLICATE_KEY:
+                result["status"] = "duplicate"
+            else:
+                result.update({"status": "error", "error": error.get("errmsg", "Write failed")})
+
+        created = [record for record, result in zip(records, record_results) if result["status"] == "created"]
+        if created:
+            swipe_versions.bump(swiper_id)
+            dirty_users.mark(swiper_id)
+            remember_swiped(swiper_id, [record["swiped_id"] for record in created])
+            push_hub.swiped(swiper_id, [(record["swiped_id"], record["liked"]) for record in created])
+        try:
+            await apply_counters(users, created)
+        except Exception as e:
+            logger.error("swipe_batch.counter_error", error=e)
+
+        # The swipes are already stored, so a failed match upsert must not fail the request;
+        # the backfill script recovers matches missed here
+        liked_ids = [record["swiped_id"] for record in created if record["liked"]]
+        matched = set()
+        try:
+            matched = await record_matches(swipes, db['matches'], swiper_id, liked_ids, created_at=now)
+        except Exception as e:
+            logger.error("swipe_batch.match_error", error=e)
+        for record, result in zip(records, record_results):
+            if result["status"] == "created":
+                result["match"] = record["swiped_id"] in matched
+
+        return {
+            "created": sum(1 for result in results if result["status"] == "created"),
+            "duplicates": sum(1 for result in results if result["status"] == "duplicate"),
+            "matches": len(matched),
+            "results": results
+        }
+
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
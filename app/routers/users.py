@@ -1,24 +1,53 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi import APIRouter, HTTPException, Query, Depends, Request, Response
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
 from app.schemas import User, UserCreate, UserUpdate, UserResponse
-from app.routers.auth import get_password_hash, oauth2_scheme
-from app.database import client
+from app.routers.auth import get_password_hash_async, oauth2_scheme, password_pool_busy_exception
+from app.utils.password_pool import PoolSaturatedError
+from app.utils.logs import get_logger
+from app.utils.pagination import apply_cursor, next_cursor, InvalidCursorError
+from app.utils.conditional import (
+    VALIDATOR_PROJECTION, document_validators, is_conditional, is_not_modified, not_modified, set_validators
+)
+from app.utils.location_index import location_index, LOCATION_MATCH_DEFAULT
+from app.utils.search_keys import normalize_key, prefix_query
+from app.utils.swipe_counters import initial_counters
+from app.database import get_db
 import logging
 
 router = APIRouter()
+logger = get_logger(__name__)
+
+# Orderings available for keyset pagination; each ends in _id so it is total
+USER_SORTS = {
+    "_id": [("_id", 1)],
+    "age": [("age", 1), ("_id", 1)],
+}
 
 @router.get("/users")
 async def get_users(
+    response: Response,
     skip: int = 0,
     limit: int = 10,
     age_min: Optional[int] = None,
     age_max: Optional[int] = None,
     gender: Optional[str] = None,
     preferred_gender: Optional[str] = None,
-    location: Optional[str] = None
+    location: Optional[str] = None,
+    location_match: str = Query(LOCATION_MATCH_DEFAULT, pattern="^(contains|prefix|fuzzy)$"),
+    cursor: Optional[str] = None,
+    order_by: str = Query("_id", pattern="^(_id|age)$"),
+    db = Depends(get_db)
 ):
+    """
+    List users. Pass the X-Next-Cursor response header back as ``cursor``
+    to fetch the following page without ``skip``.
+
+    ``location_match`` selects how ``location`` is matched: "contains" is a
+    case-insensitive substring scan, "prefix" and "fuzzy" use the
+    ``location_key`` index.
+    """
     try:
         # Build query
         query = {}
@@ -35,15 +64,26 @@ async def get_users(
         if preferred_gender:
             query["preferred_gender"] = preferred_gender
             
-        if location:
-            query["location"] = {"$regex": location, "$options": "i"}
-
         # Get database reference
-        db = client['recommendation_system']
         users = db['users']
 
+        if location:
+            if location_match != "contains" and not normalize_key(location):
+                raise HTTPException(status_code=400, detail="location must not be blank")
+            if location_match == "prefix":
+                query["location_key"] = prefix_query(location)
+            elif location_match == "fuzzy":
+                await location_index.refresh(users)
+                query["location_key"] = {"$in": location_index.search(location)}
+            else:
+                query["location"] = {"$regex": location, "$options": "i"}
+
+        # Seek past the previous page instead of skipping
+        sort = USER_SORTS[order_by]
+        query = apply_cursor(query, cursor, sort)
+
         # Execute query with projection to include all fields
-        cursor = users.find(query, {
+        find = users.find(query, {
             "_id": 1,
             "name": 1,
             "age": 1,
@@ -54,31 +94,48 @@ async def get_users(
             "profile_image": 1,
             "created_at": 1,
             "updated_at": 1
-        }).skip(skip).limit(limit)
+        }).sort(sort)
+        if not cursor:
+            find = find.skip(skip)
         
-        results = []
-        async for user in cursor:
+        results = await find.limit(limit).to_list(length=None)
+
+        next_token = next_cursor(results, limit, sort)
+        if next_token:
+            response.headers["X-Next-Cursor"] = next_token
+
+        for user in results:
             user["_id"] = str(user["_id"])
-            results.append(user)
             
         return results
 
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/users/{user_id}")
-async def get_user(user_id: str):
+async def get_user(user_id: str, request: Request, response: Response, db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         users = db['users']
         
+        if is_conditional(request):
+            stamp = await users.find_one({"_id": ObjectId(user_id)}, VALIDATOR_PROJECTION)
+            if stamp is not None and is_not_modified(request, document_validators(stamp)):
+                return not_modified(document_validators(stamp))
+
         user = await users.find_one({"_id": ObjectId(user_id)})
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
             
+        set_validators(response, document_validators(user))
         user["_id"] = str(user["_id"])
         return user
         
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -87,10 +144,10 @@ async def get_matches(
     user_id: str,
     limit: int = 10,
     min_age: Optional[int] = None,
-    max_age: Optional[int] = None
+    max_age: Optional[int] = None,
+    db = Depends(get_db)
 ):
     try:
-        db = client['recommendation_system']
         users = db['users']
         
         # Get user preferences
@@ -135,9 +192,8 @@ async def get_matches(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/users", response_model=User)
-async def create_user(user: UserCreate):
+async def create_user(user: UserCreate, db = Depends(get_db)):
     try:
-        db = client['recommendation_system']
         users = db['users']
         
         # Check if user already exists
@@ -165,7 +221,9 @@ async def create_user(user: UserCreate):
             )
         
         # Hash password
-        user_dict["password"] = get_password_hash(user_dict["password"])
+        user_dict["password"] = await get_password_hash_async(user_dict["password"])
+        user_dict["location_key"] = normalize_key(user_dict["location"])
+        user_dict.update(initial_counters())
         user_dict["created_at"] = datetime.utcnow()
         user_dict["updated_at"] = datetime.utcnow()
         
@@ -182,6 +240,8 @@ async def create_user(user: UserCreate):
         
     except HTTPException as he:
         raise he
+    except PoolSaturatedError:
+        raise password_pool_busy_exception()
     except Exception as e:
-        print(f"Error creating user: {str(e)}")  # Add logging
+        logger.exception("create_user.error", error=e)
         raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}") 
\ No newline at end of file
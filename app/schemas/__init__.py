@@ -71,6 +71,12 @@ class RecommendationUpdate(BaseModel):
     rating: Optional[float] = None
     category: Optional[str] = None
 
+class RecommendationBulkUpdate(RecommendationUpdate):
+    id: str
+
+class RecommendationBulkDelete(BaseModel):
+    ids: List[str]
+
 class Recommendation(RecommendationBase):
     id: str = Field(alias="_id")
     created_at: datetime
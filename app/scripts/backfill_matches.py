@@ -0,0 +1,17 @@
+import asyncio
+from app.database import INDEX_SPECS, db, client
+from app.utils.indexes import reconcile_indexes
+from app.utils.matches import backfill_matches
+
+async def backfill():
+    try:
+        # $merge needs the unique (user1_id, user2_id) index to exist
+        await reconcile_indexes(db.matches, INDEX_SPECS["matches"], drop_obsolete=False)
+        before = await db.matches.count_documents({})
+        after = await backfill_matches(db)
+        print(f"Matches: {before} before, {after} after ({after - before} added)")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
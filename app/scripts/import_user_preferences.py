@@ -1,15 +1,19 @@
 import pandas as pd
 from pymongo import MongoClient
 from datetime import datetime
+import asyncio
 import os
 from ..utils.image_mapping import get_random_image_for_gender
+from ..utils.search_keys import normalize_key
+from ..database import MONGODB_URL, DB_NAME, sync_indexes
 
 # File path
 CSV_PATH = "C:/Users/Lenovo/OneDrive/Desktop/Recommendation System for JTP/app/matching_users_with_preferences_dataset.csv"
 
 # MongoDB connection
-client = MongoClient('mongodb://localhost:27017')
-db = client['recommendation_system']
+# Same database as the app
+client = MongoClient(MONGODB_URL)
+db = client[DB_NAME]
 users_collection = db['users']
 
 def import_user_preferences():
@@ -30,6 +34,7 @@ def import_user_preferences():
         for record in records:
             record['created_at'] = current_time
             record['updated_at'] = current_time
+            record['location_key'] = normalize_key(record.get('location'))
             
             # Assign profile image based on gender
             profile_image = get_random_image_for_gender(record['gender'], used_images)
@@ -44,10 +49,8 @@ def import_user_preferences():
         result = users_collection.insert_many(records)
         print(f"Successfully inserted {len(result.inserted_ids)} user records")
 
-        # Create indexes for better query performance
-        users_collection.create_index("gender")
-        users_collection.create_index("age")
-        users_collection.create_index("preferred_gender")
+        # Create the indexes declared in app.database, so the next app start keeps them
+        asyncio.run(sync_indexes(drop_obsolete=False))
         print("Created indexes")
 
         # Display some sample data
@@ -1,7 +1,8 @@
 from pymongo import MongoClient
 from datetime import datetime
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
+# Same MONGODB_URL and DB_NAME as the app
+from app.database import client, db, sync_indexes
 
 # Sample data with more diverse recommendations
 sample_recommendations = [
@@ -73,9 +74,6 @@ sample_recommendations = [
 
 async def populate_db():
     try:
-        # Connect to MongoDB
-        client = AsyncIOMotorClient('mongodb://localhost:27017')
-        db = client['recommendation_system']
         recommendations = db['recommendations']
 
         # Delete existing recommendations
@@ -86,10 +84,8 @@ async def populate_db():
         result = await recommendations.insert_many(sample_recommendations)
         print(f"Successfully inserted {len(result.inserted_ids)} recommendations")
 
-        # Create indexes
-        await recommendations.create_index("title")
-        await recommendations.create_index("category")
-        await recommendations.create_index([("title", "text"), ("description", "text")])
+        # Create the indexes declared in app.database, so the next app start keeps them
+        await sync_indexes(drop_obsolete=False)
         print("Created indexes")
 
         # Verify the data
@@ -1,6 +1,7 @@
-from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime
 import asyncio
+# Same MONGODB_URL and DB_NAME as the app
+from app.database import client, db, sync_indexes
 
 # Sample recommendations data
 sample_recommendations = [
@@ -48,22 +49,20 @@ sample_recommendations = [
 
 async def populate_recommendations():
     try:
-        # Connect to MongoDB
-        client = AsyncIOMotorClient('mongodb://localhost:27017')
-        db = client['recommendation_system']
         recommendations = db['recommendations']
         
         # Clear existing recommendations
         await recommendations.delete_many({})
         print("Cleared existing recommendations")
         
-        # Insert sample recommendations
+        # Insert sample recommendations, with the normalized title prefix search runs on
+        for recommendation in sample_recommendations:
+            recommendation["title_key"] = recommendation["title"].strip().lower()
         result = await recommendations.insert_many(sample_recommendations)
         print(f"Successfully inserted {len(result.inserted_ids)} recommendations")
         
-        # Create indexes
-        await recommendations.create_index("title")
-        await recommendations.create_index("category")
+        # Create the indexes declared in app.database, so the next app start keeps them
+        await sync_indexes(drop_obsolete=False)
         print("Created indexes")
         
         # Verify the data
@@ -0,0 +1,27 @@
+import argparse
+import asyncio
+from app.database import INDEX_SPECS, INDEX_DROP_OBSOLETE, sync_indexes, client
+
+async def reconcile(dry_run: bool, drop_obsolete: bool):
+    try:
+        plans = await sync_indexes(dry_run=dry_run, drop_obsolete=drop_obsolete)
+        for name in INDEX_SPECS:
+            plan = plans[name]
+            if "error" in plan:
+                print(f"{name}: failed ({plan['error']})")
+                continue
+            print(f"{name}: create {plan['create'] or 'nothing'}, drop {plan['drop'] or 'nothing'}")
+        if dry_run:
+            print("\nDry run: no indexes were changed")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create missing and drop obsolete MongoDB indexes")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would change")
+    parser.add_argument("--drop-obsolete", action="store_true", help="drop undeclared indexes")
+    parser.add_argument("--keep-obsolete", action="store_true",
+                        help="do not drop undeclared indexes, even with INDEX_DROP_OBSOLETE=true")
+    args = parser.parse_args()
+
+    asyncio.run(reconcile(args.dry_run, (INDEX_DROP_OBSOLETE or args.drop_obsolete) and not args.keep_obsolete))
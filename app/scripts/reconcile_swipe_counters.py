@@ -0,0 +1,13 @@
+import asyncio
+from app.database import db, client
+from app.utils.swipe_counters import reconcile_counters
+
+async def reconcile():
+    try:
+        without_swipes = await reconcile_counters(db)
+        print(f"Swipe counters recounted; {without_swipes} users without swipes were reset to zero")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(reconcile())
@@ -0,0 +1,156 @@
+"""
+Admission control and request deadlines for expensive endpoints.
+
+``AdmissionController`` lets at most ``limit`` requests run a code path at
+once and at most ``max_queue`` more wait for a slot. A request arriving at
+a full queue is rejected right away with ``AdmissionRejectedError`` (the
+router answers 503 + Retry-After) instead of piling up on MongoDB and the
+event loop.
+
+``deadline(ms)`` gives the current request a time budget, held in a context
+variable so it follows the request into tasks it starts. Waiting for an
+admission slot counts against it, and ``mongo_time_limit()`` hands what is
+left to MongoDB as ``maxTimeMS``, so the server gives up on a query once
+the caller can no longer use the answer.
+
+``busy_response(retry_after)`` is the 503 every overloaded path answers
+with, and ``LazyPrimitive`` defers creating asyncio primitives held by
+module-level singletons until they are first used.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Generic, Optional, TypeVar
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() by which the current request must be answered
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+def busy_response(retry_after: int) -> HTTPException:
+    """503 telling the client to retry after ``retry_after`` seconds."""
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry shortly",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+class LazyPrimitive(Generic[T]):
+    """
+    An asyncio primitive created by ``get()`` on first use.
+
+    Singletons holding one are built at import, possibly in a gunicorn master
+    before the workers fork, and on Python < 3.10 a primitive binds to the
+    loop current at creation rather than the worker's.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Optional[T] = None
+
+    @property
+    def created(self) -> bool:
+        return self._value is not None
+
+    def get(self) -> T:
+        if self._value is None:
+            self._value = self._factory()
+        return self._value
+
+
+class AdmissionRejectedError(Exception):
+    """Raised when a controller's wait queue is full."""
+
+
+class DeadlineExceededError(Exception):
+    """Raised when the current request's deadline has passed."""
+
+
+@contextmanager
+def deadline(milliseconds: Optional[float]):
+    """Run the block with a deadline ``milliseconds`` from now (none if falsy)."""
+    token = current_deadline.set(time.monotonic() + milliseconds / 1000 if milliseconds else None)
+    try:
+        yield
+    finally:
+        current_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, None without one; raises once it has passed."""
+    expires_at = current_deadline.get()
+    if expires_at is None:
+        return None
+    left = expires_at - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceededError("Request deadline exceeded")
+    return left
+
+
+def max_time_ms() -> Optional[int]:
+    """The remaining budget as a MongoDB ``maxTimeMS`` value, or None."""
+    left = remaining()
+    return None if left is None else max(1, int(left * 1000))
+
+
+def mongo_time_limit() -> Dict[str, int]:
+    """``maxTimeMS`` keyword argument for aggregate/count/distinct, empty without a deadline."""
+    limit = max_time_ms()
+    return {} if limit is None else {"maxTimeMS": limit}
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue."""
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self._semaphore = LazyPrimitive(lambda: asyncio.Semaphore(self.limit))
+        # Only touched from the event loop thread, so no lock is needed
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        """Hold a slot for the duration of the block, waiting at most until the deadline."""
+        semaphore = self._semaphore.get()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejectedError(f"{self.name}: {self.waiting} requests already waiting")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=remaining())
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise DeadlineExceededError(f"{self.name}: deadline passed while waiting for a slot")
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            semaphore.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
@@ -0,0 +1,154 @@
+"""
+Precomputed recommendations for users who have not liked anyone yet.
+
+Profiles are grouped into segments by gender and age bucket
+(``COLD_START_AGE_BUCKET`` years wide). Each segment keeps its
+``COLD_START_SEGMENT_SIZE`` best profiles, scored by popularity (the
+smoothed ``like_rate`` swipe counter) and by how complete the profile is.
+One aggregation builds every segment; a scheduler job rebuilds them every
+``COLD_START_REFRESH_SECONDS``.
+
+A request is answered from memory with one dict lookup: the segment for the
+viewer's preferred gender and own age, minus the profiles they have already
+swiped on.
+"""
+
+import heapq
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from app.utils.swipe_counters import LIKE_RATE_PRIOR
+from app.utils.single_flight import single_flight
+
+load_dotenv()
+
+COLD_START_AGE_BUCKET = int(os.getenv("COLD_START_AGE_BUCKET", "5"))
+COLD_START_SEGMENT_SIZE = int(os.getenv("COLD_START_SEGMENT_SIZE", "100"))
+COLD_START_REFRESH_SECONDS = float(os.getenv("COLD_START_REFRESH_SECONDS", "300"))
+COLD_START_POPULARITY_WEIGHT = float(os.getenv("COLD_START_POPULARITY_WEIGHT", "0.7"))
+COLD_START_COMPLETENESS_WEIGHT = float(os.getenv("COLD_START_COMPLETENESS_WEIGHT", "0.3"))
+
+# Fields that make a profile complete; each one filled in adds to the score
+PROFILE_FIELDS = [
+    "name", "age", "gender", "location", "religion", "education_level",
+    "profession", "hobbies", "languages", "diet", "profile_image",
+]
+
+# Segment key: (gender or ANY_GENDER, age bucket or ANY_AGE)
+ANY_GENDER = "any"
+ANY_AGE = None
+SegmentKey = Tuple[str, Optional[int]]
+
+
+def age_bucket(age) -> Optional[int]:
+    if not isinstance(age, (int, float)):
+        return ANY_AGE
+    return int(age // COLD_START_AGE_BUCKET) * COLD_START_AGE_BUCKET
+
+
+def segment_key(preferred_gender, age) -> SegmentKey:
+    """Segment a viewer is served from."""
+    gender = preferred_gender.lower() if isinstance(preferred_gender, str) else ""
+    if not gender or gender == "other":
+        gender = ANY_GENDER
+    return gender, age_bucket(age)
+
+
+def segment_pipeline(size: int = COLD_START_SEGMENT_SIZE) -> List[dict]:
+    """Aggregation returning the top ``size`` profiles of every (gender, age bucket)."""
+    filled = {"$size": {"$filter": {
+        "input": [f"${field}" for field in PROFILE_FIELDS],
+        "cond": {"$not": [{"$in": ["$$this", [None, "", [], float("nan")]]}]},
+    }}}
+    return [
+        {"$match": {"age": {"$type": "number"}, "gender": {"$type": "string"}}},
+        {"$project": {"password": 0}},
+        {"$set": {
+            "cold_start_score": {"$add": [
+                {"$multiply": [{"$ifNull": ["$like_rate", LIKE_RATE_PRIOR]}, COLD_START_POPULARITY_WEIGHT]},
+                {"$multiply": [{"$divide": [filled, len(PROFILE_FIELDS)]}, COLD_START_COMPLETENESS_WEIGHT]},
+            ]},
+        }},
+        {"$group": {
+            "_id": {
+                "gender": {"$toLower": "$gender"},
+                "age_bucket": {"$multiply": [
+                    {"$floor": {"$divide": ["$age", COLD_START_AGE_BUCKET]}}, COLD_START_AGE_BUCKET
+                ]},
+            },
+            # Keeps only the best ``size`` per group instead of buffering them all
+            "profiles": {"$topN": {"n": size, "sortBy": {"cold_start_score": -1, "_id": 1}, "output": "$$ROOT"}},
+        }},
+    ]
+
+
+def _best(lists: Iterable[List[dict]], size: int) -> List[dict]:
+    """Merge lists already sorted by score into the overall top ``size``."""
+    merged = heapq.merge(*lists, key=lambda profile: (-profile["cold_start_score"], str(profile["_id"])))
+    return [profile for _, profile in zip(range(size), merged)]
+
+
+class ColdStartSegments:
+    """In-memory cold-start lists per segment, rebuilt periodically."""
+
+    def __init__(self, size: int = COLD_START_SEGMENT_SIZE):
+        self.size = size
+        self._segments: Dict[SegmentKey, List[dict]] = {}
+        self.built_at: Optional[float] = None
+        self.served = 0
+        self.refreshes = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.built_at is not None
+
+    async def refresh(self, users) -> None:
+        """Rebuild every segment from ``users``; concurrent calls share one rebuild."""
+        await single_flight.do("cold_start.refresh", self._rebuild, users)
+
+    async def _rebuild(self, users) -> None:
+        """Rebuild every segment from ``users`` and swap them in at once."""
+        rows = await users.aggregate(segment_pipeline(self.size)).to_list(length=None)
+
+        segments: Dict[SegmentKey, List[dict]] = {}
+        for row in rows:
+            segments[(row["_id"]["gender"], int(row["_id"]["age_bucket"]))] = row["profiles"]
+
+        # Wider segments for viewers without a gender preference or a known age
+        by_gender: Dict[str, List[List[dict]]] = {}
+        by_age: Dict[int, List[List[dict]]] = {}
+        for (gender, bucket), profiles in segments.items():
+            by_gender.setdefault(gender, []).append(profiles)
+            by_age.setdefault(bucket, []).append(profiles)
+        wider: Dict[SegmentKey, List[dict]] = {}
+        for gender, lists in by_gender.items():
+            wider[(gender, ANY_AGE)] = _best(lists, self.size)
+        for bucket, lists in by_age.items():
+            wider[(ANY_GENDER, bucket)] = _best(lists, self.size)
+        wider[(ANY_GENDER, ANY_AGE)] = _best(segments.values(), self.size)
+        segments.update(wider)
+
+        self._segments = segments
+        self.built_at = time.time()
+        self.refreshes += 1
+
+    def recommend(self, preferred_gender, age, exclude_ids: Iterable, limit: int = 10) -> List[dict]:
+        """Top ``limit`` profiles of the viewer's segment that are not in ``exclude_ids``."""
+        gender, bucket = segment_key(preferred_gender, age)
+        candidates = self._segments.get((gender, bucket)) or self._segments.get((gender, ANY_AGE), [])
+        excluded = {str(i) for i in exclude_ids}
+        self.served += 1
+        return [profile for profile in candidates if str(profile["_id"]) not in excluded][:limit]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "ready": self.ready,
+            "segments": len(self._segments),
+            "built_at": self.built_at,
+            "served": self.served,
+            "refreshes": self.refreshes,
+        }
+
+
+cold_start = ColdStartSegments()
@@ -0,0 +1,91 @@
+"""
+Conditional GET support (ETag / Last-Modified).
+
+Single documents are validated by their ``_id`` and ``updated_at``, which
+every write path in the API maintains, so a conditional request can be
+answered from a projection of those two fields without loading the full
+document. List responses use a hash over the same pair for every item on
+the page.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+from fastapi import Request, Response
+
+# Fields needed to compute validators without fetching whole documents
+VALIDATOR_PROJECTION = {"_id": 1, "updated_at": 1}
+
+Validators = Tuple[Optional[str], Optional[datetime]]
+
+
+def _stamp(doc: dict) -> str:
+    updated_at = doc.get("updated_at")
+    return f"{doc.get('_id')}:{updated_at.isoformat() if isinstance(updated_at, datetime) else ''}"
+
+
+def document_validators(doc: dict) -> Validators:
+    """Return (ETag, Last-Modified) for one document, or (None, None) if it has no ``updated_at``."""
+    updated_at = doc.get("updated_at")
+    if not isinstance(updated_at, datetime):
+        return None, None
+    digest = hashlib.sha1(_stamp(doc).encode("utf-8")).hexdigest()[:20]
+    return f'W/"{digest}"', updated_at
+
+
+def list_validators(docs: Iterable[dict]) -> Validators:
+    """Return the ETag for a page of documents; lists carry no Last-Modified."""
+    digest = hashlib.sha1()
+    for doc in docs:
+        digest.update(_stamp(doc).encode("utf-8"))
+        digest.update(b"|")
+    return f'W/"{digest.hexdigest()[:20]}"', None
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, validators: Validators) -> bool:
+    """Evaluate If-None-Match (weak comparison) and, failing that, If-Modified-Since."""
+    etag, last_modified = validators
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if etag is None:
+            return False
+        candidates = {tag.strip() for tag in if_none_match.split(",")}
+        return "*" in candidates or _opaque(etag) in {_opaque(tag) for tag in candidates}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = _as_utc(parsedate_to_datetime(if_modified_since))
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second resolution
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+
+def set_validators(response: Response, validators: Validators) -> None:
+    etag, last_modified = validators
+    if etag:
+        response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+
+
+def not_modified(validators: Validators) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, validators)
+    return response
+
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Stored timestamps are naive UTC (datetime.utcnow)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
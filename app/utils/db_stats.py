@@ -0,0 +1,104 @@
+"""
+Per-route MongoDB command statistics.
+
+``DbStatsMiddleware`` gives every request a ``RequestDbStats`` through the
+``current_db_stats`` context variable; ``CommandStatsListener`` fills it in
+as commands complete. When the response starts, the totals are folded into
+``route_db_stats`` under the matched route template, and optionally echoed
+back in an ``X-DB-Stats`` header.
+"""
+
+import os
+import threading
+from typing import Dict
+from dotenv import load_dotenv
+from app.utils.mongo_monitoring import RequestDbStats, current_db_stats
+
+load_dotenv()
+
+DB_STATS_HEADER = os.getenv("DB_STATS_HEADER", "false").lower() == "true"
+
+
+def route_template(scope) -> str:
+    """Path template of the route that handled ``scope``, e.g. ``/api/profiles/{profile_id}``."""
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+
+def route_key(scope) -> str:
+    """``METHOD /route/{template}`` for the route that handled ``scope``."""
+    return f"{scope.get('method', '')} {route_template(scope)}"
+
+
+class RouteDbStats:
+    """Running totals of database work per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, float]] = {}
+
+    def add(self, route: str, stats: RequestDbStats) -> None:
+        with self._lock:
+            totals = self._routes.setdefault(route, {
+                "requests": 0, "commands": 0, "round_trips": 0,
+                "documents": 0, "failures": 0, "duration_micros": 0,
+            })
+            totals["requests"] += 1
+            totals["commands"] += stats.commands
+            totals["round_trips"] += stats.round_trips
+            totals["documents"] += stats.documents
+            totals["failures"] += stats.failures
+            totals["duration_micros"] += stats.duration_micros
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            routes = {route: dict(totals) for route, totals in self._routes.items()}
+        for totals in routes.values():
+            requests = totals["requests"] or 1
+            totals["db_time_ms"] = round(totals.pop("duration_micros") / 1000, 3)
+            totals["avg_round_trips"] = round(totals["round_trips"] / requests, 2)
+            totals["avg_documents"] = round(totals["documents"] / requests, 2)
+            totals["avg_db_time_ms"] = round(totals["db_time_ms"] / requests, 3)
+        return routes
+
+    def reset(self) -> None:
+        with self._lock:
+            self._routes.clear()
+
+
+route_db_stats = RouteDbStats()
+
+
+class DbStatsMiddleware:
+    """ASGI middleware attributing MongoDB commands to the active route."""
+
+    def __init__(self, app, header: bool = DB_STATS_HEADER):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats()
+        token = current_db_stats.set(stats)
+        recorded = False
+
+        async def send_with_stats(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                # Handlers have finished their queries once the response starts
+                recorded = True
+                route_db_stats.add(route_key(scope), stats)
+                if self.header:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-db-stats", stats.header_value().encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            if not recorded:
+                route_db_stats.add(route_key(scope), stats)
+            current_db_stats.reset(token)
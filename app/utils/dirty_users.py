@@ -0,0 +1,115 @@
+"""
+Users whose recommendation inputs changed since they were last precomputed.
+
+Swipes and profile edits ``mark`` the user in an in-process set, which
+costs nothing on the request path. A scheduler job ``flush``es the set to
+the ``dirty_users`` collection (``{_id: user_id, marked_at}``), shared by
+all workers. ``marked_at`` is the time of the latest change, not of the
+flush, so a reader can skip users whose state it already refreshed since.
+
+There are two ways to read the collection:
+
+* ``drain`` is for a job that alone owns the recomputation, e.g. an
+  exclusive scheduler job. Each mark is claimed with ``find_one_and_delete``,
+  so two workers draining at once never both get it.
+* ``peek`` leaves the marks in place. It is for state every worker holds a
+  copy of, such as pushed SSE decks: a user may be connected to several
+  workers at once, and each of them has to see the mark.
+
+Marks that are peeked but never drained, including those of users who are
+not connected anywhere, are only removed by the TTL index, after
+``DIRTY_USER_TTL_SECONDS`` (24 hours by default) without a newer change.
+"""
+
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DIRTY_USER_TTL_SECONDS = int(os.getenv("DIRTY_USER_TTL_SECONDS", "86400"))
+DIRTY_USERS_DRAIN_LIMIT = int(os.getenv("DIRTY_USERS_DRAIN_LIMIT", "500"))
+DIRTY_USERS_FLUSH_SECONDS = float(os.getenv("DIRTY_USERS_FLUSH_SECONDS", "2"))
+
+
+class DirtyUserSet:
+    """In-process marks, flushed to and drained from a MongoDB collection."""
+
+    def __init__(self):
+        # User id -> time of their latest change
+        self._pending: Dict[ObjectId, datetime] = {}
+        self.marked = 0
+        self.flushed = 0
+        self.drained = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def mark(self, user_id) -> None:
+        self._pending[ObjectId(str(user_id))] = datetime.utcnow()
+        self.marked += 1
+
+    async def flush(self, collection) -> int:
+        """Write the local marks to ``collection``; returns how many users were written."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        try:
+            await collection.bulk_write(
+                [UpdateOne({"_id": user_id}, {"$max": {"marked_at": marked_at}}, upsert=True)
+                 for user_id, marked_at in pending.items()],
+                ordered=False
+            )
+        except Exception:
+            # Keep the marks for the next flush; ones made meanwhile are newer
+            self._pending = {**pending, **self._pending}
+            raise
+        self.flushed += len(pending)
+        return len(pending)
+
+    async def drain(self, collection, user_ids: Optional[Iterable] = None,
+                    limit: int = DIRTY_USERS_DRAIN_LIMIT) -> Dict[ObjectId, datetime]:
+        """
+        Claim up to ``limit`` dirty users, oldest mark first, optionally only
+        among ``user_ids``; the claimed marks are removed and returned as
+        user id -> marked_at.
+
+        Every mark is removed by its own ``find_one_and_delete``, so a
+        concurrent drain claims other users or none, never the same ones.
+        A mark made after the claim is a new document and stays.
+        """
+        query = _user_query(user_ids)
+        claimed = {}
+        while len(claimed) < limit:
+            mark = await collection.find_one_and_delete(query, sort=[("marked_at", 1)])
+            if mark is None:
+                break
+            claimed[mark["_id"]] = mark["marked_at"]
+        self.drained += len(claimed)
+        return claimed
+
+    async def peek(self, collection, user_ids: Iterable,
+                   limit: int = DIRTY_USERS_DRAIN_LIMIT) -> Dict[ObjectId, datetime]:
+        """Marks of ``user_ids`` as user id -> marked_at, without removing them."""
+        marks = await collection.find(_user_query(user_ids)).sort("marked_at", 1).limit(limit).to_list(length=None)
+        return {mark["_id"]: mark["marked_at"] for mark in marks}
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "marked": self.marked,
+            "flushed": self.flushed,
+            "drained": self.drained,
+        }
+
+
+def _user_query(user_ids: Optional[Iterable]) -> dict:
+    if user_ids is None:
+        return {}
+    return {"_id": {"$in": [ObjectId(str(user_id)) for user_id in user_ids]}}
+
+
+dirty_users = DirtyUserSet()
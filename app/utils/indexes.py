@@ -0,0 +1,91 @@
+"""
+Index reconciliation.
+
+Compares the indexes declared for a collection with what ``list_indexes()``
+reports and only creates the missing ones and drops the obsolete ones,
+instead of dropping and rebuilding everything on each start. Indexes are
+matched by name (pymongo's generated name unless one is given); an index
+whose name matches but whose key or options differ is rebuilt.
+"""
+
+import logging
+from typing import Dict, List
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Options that change an index's behaviour and so must match to be reused
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# Server error code for "index not found", raised when another worker dropped it first
+_INDEX_NOT_FOUND = 27
+
+
+def _key_signature(document: dict) -> tuple:
+    key = document["key"]
+    if "_fts" in key:
+        # Text indexes are listed as {_fts: "text", _ftsx: 1} plus their weights
+        return ("text", tuple(sorted(document.get("weights", {}))))
+    return tuple((field, value) for field, value in key.items())
+
+
+def _declared_signature(model: IndexModel) -> tuple:
+    document = model.document
+    key = dict(document["key"])
+    if "text" in key.values():
+        text_fields = sorted(field for field, kind in key.items() if kind == "text")
+        return ("text", tuple(text_fields))
+    return tuple(key.items())
+
+
+def _options(document: dict) -> dict:
+    return {option: document.get(option) for option in _COMPARED_OPTIONS if document.get(option) not in (None, False)}
+
+
+async def plan_indexes(collection, declared: List[IndexModel], drop_obsolete: bool = True) -> Dict[str, list]:
+    """Return the names of indexes to create and to drop on ``collection``."""
+    existing = {index["name"]: index async for index in collection.list_indexes()}
+    declared_by_name = {model.document["name"]: model for model in declared}
+
+    create, drop = [], []
+    for name, model in declared_by_name.items():
+        current = existing.get(name)
+        if current is None:
+            create.append(name)
+        elif (_key_signature(current) != _declared_signature(model)
+              or _options(current) != _options(model.document)):
+            drop.append(name)
+            create.append(name)
+
+    if drop_obsolete:
+        drop.extend(name for name in existing if name != "_id_" and name not in declared_by_name)
+
+    return {"create": create, "drop": drop}
+
+
+async def reconcile_indexes(collection, declared: List[IndexModel],
+                            dry_run: bool = False, drop_obsolete: bool = True) -> Dict[str, list]:
+    """
+    Bring the indexes of ``collection`` in line with ``declared``.
+
+    With ``dry_run`` nothing is changed and the plan is only returned.
+    """
+    plan = await plan_indexes(collection, declared, drop_obsolete=drop_obsolete)
+    for action in ("drop", "create"):
+        for name in plan[action]:
+            logger.info("%s index %s.%s%s", action.capitalize(), collection.name, name,
+                        " (dry run)" if dry_run else "")
+    if dry_run:
+        return plan
+
+    for name in plan["drop"]:
+        try:
+            await collection.drop_index(name)
+        except OperationFailure as e:
+            if e.code != _INDEX_NOT_FOUND:
+                raise
+    if plan["create"]:
+        to_create = [model for model in declared if model.document["name"] in plan["create"]]
+        await collection.create_indexes(to_create)
+    return plan
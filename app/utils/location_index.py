@@ -0,0 +1,87 @@
+"""
+Index-friendly location search.
+
+User documents carry a ``location_key``, the location normalized by
+``app.utils.search_keys.normalize_key``; prefix searches run on it as an
+index range scan instead of a collection scan.
+
+Fuzzy searches go through ``LocationNgramIndex``, an in-memory trigram
+index over the distinct location keys (a few hundred cities at most). It
+expands a misspelt or partial query into the matching keys, and the
+database query becomes an indexed ``$in``.
+"""
+
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+from dotenv import load_dotenv
+from app.utils.search_keys import normalize_key
+from app.utils.single_flight import single_flight
+
+load_dotenv()
+
+# Default for the location_match parameter of /users: contains | prefix | fuzzy
+LOCATION_MATCH_DEFAULT = os.getenv("LOCATION_MATCH_DEFAULT", "contains")
+LOCATION_INDEX_TTL_SECONDS = float(os.getenv("LOCATION_INDEX_TTL_SECONDS", "300"))
+LOCATION_FUZZY_THRESHOLD = float(os.getenv("LOCATION_FUZZY_THRESHOLD", "0.6"))
+LOCATION_FUZZY_LIMIT = int(os.getenv("LOCATION_FUZZY_LIMIT", "50"))
+
+
+def _trigrams(value: str) -> Set[str]:
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LocationNgramIndex:
+    """Trigram index over the distinct ``location_key`` values."""
+
+    def __init__(self, ttl: float = LOCATION_INDEX_TTL_SECONDS):
+        self.ttl = ttl
+        self._postings: Dict[str, Set[str]] = {}
+        self._loaded_at: Optional[float] = None
+
+    def build(self, keys: Iterable[str]) -> None:
+        postings: Dict[str, Set[str]] = defaultdict(set)
+        for key in keys:
+            if key:
+                for gram in _trigrams(key):
+                    postings[gram].add(key)
+        self._postings = dict(postings)
+        self._loaded_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def refresh(self, users, force: bool = False) -> None:
+        """
+        Reload the distinct location keys if the index is older than ``ttl``;
+        requests that find it stale at the same time share one reload.
+        """
+        if force or self.is_stale():
+            await single_flight.do(("location_index.refresh", id(self)), self._reload, users)
+
+    async def _reload(self, users) -> None:
+        self.build(await users.distinct("location_key"))
+
+    def search(self, query: str, threshold: float = LOCATION_FUZZY_THRESHOLD,
+               limit: int = LOCATION_FUZZY_LIMIT) -> List[str]:
+        """
+        Return location keys sharing at least ``threshold`` of the query's
+        trigrams, best matches first.
+        """
+        normalized = normalize_key(query)
+        if not normalized:
+            return []
+        grams = _trigrams(normalized)
+        hits: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for key in self._postings.get(gram, ()):
+                hits[key] += 1
+        matches = [(count / len(grams), key) for key, count in hits.items()
+                   if count / len(grams) >= threshold]
+        matches.sort(key=lambda m: (-m[0], m[1]))
+        return [key for _, key in matches[:limit]]
+
+
+location_index = LocationNgramIndex()
@@ -0,0 +1,136 @@
+"""
+Cheap structured logging for hot request paths.
+
+``get_logger(name).info("event", key=value, ...)`` emits one JSON object per
+line through the standard ``logging`` module, but:
+
+* nothing is formatted unless the record is actually emitted (the JSON is
+  rendered lazily by the handler, and disabled levels return immediately);
+* DEBUG/INFO records are sampled per route according to ``LOG_SAMPLE_RATES``,
+  e.g. ``/api/profiles/next=0.01,/api/profiles/recommended=0.1`` (longest
+  matching path prefix wins; WARNING and above are never sampled);
+* every field is capped at ``LOG_MAX_FIELD_CHARS`` characters and lists at
+  ``LOG_MAX_LIST_ITEMS`` items, so a user document or ID list cannot turn
+  into a multi-kilobyte line.
+"""
+
+import json
+import logging
+import os
+import random
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "256"))
+LOG_MAX_LIST_ITEMS = int(os.getenv("LOG_MAX_LIST_ITEMS", "10"))
+
+
+def _parse_sample_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        prefix, _, rate = item.partition("=")
+        rates[prefix.strip()] = float(rate)
+    return rates
+
+
+LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", ""))
+
+# Path of the request being served, set by LogContextMiddleware
+current_request_path: ContextVar[Optional[str]] = ContextVar("current_request_path", default=None)
+
+
+def sample_rate(path: Optional[str]) -> float:
+    if not path or not LOG_SAMPLE_RATES:
+        return 1.0
+    matches = [prefix for prefix in LOG_SAMPLE_RATES if path.startswith(prefix)]
+    return LOG_SAMPLE_RATES[max(matches, key=len)] if matches else 1.0
+
+
+def _cap(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        capped = [_cap(item) for item in items[:LOG_MAX_LIST_ITEMS]]
+        if len(items) > LOG_MAX_LIST_ITEMS:
+            capped.append(f"... {len(items) - LOG_MAX_LIST_ITEMS} more")
+        return capped
+    text = str(value) if isinstance(value, (str, ObjectId)) else repr(value)
+    if len(text) > LOG_MAX_FIELD_CHARS:
+        return text[:LOG_MAX_FIELD_CHARS] + f"... ({len(text)} chars)"
+    return text
+
+
+class _Event:
+    """Log message rendered to JSON only when a handler formats it."""
+
+    __slots__ = ("event", "fields", "path")
+
+    def __init__(self, event: str, fields: Dict[str, Any], path: Optional[str]):
+        self.event = event
+        self.fields = fields
+        self.path = path
+
+    def __str__(self) -> str:
+        payload = {"event": self.event}
+        if self.path:
+            payload["path"] = self.path
+        payload.update((key, _cap(value)) for key, value in self.fields.items())
+        return json.dumps(payload, default=str)
+
+
+class StructuredLogger:
+    """Thin wrapper over ``logging.Logger`` taking an event name and fields."""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def log(self, level: int, event: str, exc_info=None, **fields) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        path = current_request_path.get()
+        if level < logging.WARNING:
+            rate = sample_rate(path)
+            if rate < 1.0 and random.random() >= rate:
+                return
+        self.logger.log(level, "%s", _Event(event, fields, path), exc_info=exc_info)
+
+    def debug(self, event: str, **fields) -> None:
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields) -> None:
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields) -> None:
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields) -> None:
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name))
+
+
+class LogContextMiddleware:
+    """ASGI middleware exposing the request path to the sampler."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_request_path.set(scope.get("path"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request_path.reset(token)
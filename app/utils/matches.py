@@ -0,0 +1,140 @@
+"""
+Mutual matches, materialized in the ``matches`` collection.
+
+A match is stored once per pair, ordered so that ``user1_id < user2_id``;
+the unique ``(user1_id, user2_id)`` index makes recording it idempotent.
+Matches are recorded as likes come in (``record_matches``) and can be
+rebuilt from the swipes collection with ``backfill_matches``.
+
+With the write-behind buffer a like is checked at request time against
+MongoDB and this process's buffer only, so two likes buffered by different
+workers would never meet there. ``record_flushed_matches`` checks every
+batch of likes again once it is written.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.utils.swipe_buffer import swipe_buffer
+
+# Newest first; the trailing _id makes the order total for keyset pagination
+MATCH_SORT = [("created_at", -1), ("_id", -1)]
+
+
+def match_pair(a: ObjectId, b: ObjectId) -> Tuple[ObjectId, ObjectId]:
+    """The canonical (user1_id, user2_id) ordering of a pair."""
+    return (a, b) if a < b else (b, a)
+
+
+def user_matches_query(user_id: ObjectId) -> dict:
+    return {"$or": [{"user1_id": user_id}, {"user2_id": user_id}]}
+
+
+async def reverse_likes(swipes, swiper_id: ObjectId, liked_ids: Iterable[ObjectId]) -> Set[ObjectId]:
+    """Which of ``liked_ids`` have liked ``swiper_id`` back, including swipes still buffered."""
+    liked_ids = list(liked_ids)
+    if not liked_ids:
+        return set()
+    # Served by the unique (swiper_id, swiped_id) index
+    mutual = set(await swipes.distinct(
+        "swiper_id",
+        {"swiper_id": {"$in": liked_ids}, "swiped_id": swiper_id, "liked": True}
+    ))
+    for liked_id in liked_ids:
+        if swipe_buffer.pending_for(liked_id).get(swiper_id):
+            mutual.add(liked_id)
+    return mutual
+
+
+async def record_matches(swipes, matches, swiper_id: ObjectId, liked_ids: Iterable[ObjectId],
+                         created_at: Optional[datetime] = None) -> Set[ObjectId]:
+    """Upsert a match for every one of ``liked_ids`` that liked ``swiper_id`` too; returns those ids."""
+    mutual = await reverse_likes(swipes, swiper_id, liked_ids)
+    if mutual:
+        created_at = created_at or datetime.utcnow()
+        ops: List[UpdateOne] = []
+        for other_id in mutual:
+            user1_id, user2_id = match_pair(swiper_id, other_id)
+            ops.append(UpdateOne(
+                {"user1_id": user1_id, "user2_id": user2_id},
+                {"$setOnInsert": {"created_at": created_at}},
+                upsert=True
+            ))
+        await matches.bulk_write(ops, ordered=False)
+    return mutual
+
+
+async def record_flushed_matches(swipes, matches, records: Iterable[dict]) -> int:
+    """Upsert the matches completed by ``records``, swipes just written in one batch; returns how many."""
+    likes: Dict[ObjectId, Dict[ObjectId, datetime]] = {}
+    for record in records:
+        if record["liked"]:
+            likes.setdefault(record["swiper_id"], {})[record["swiped_id"]] = record["created_at"]
+    if not likes:
+        return 0
+
+    # One query for the whole batch, each clause served by the unique (swiper_id, swiped_id) index
+    reverse = await swipes.find(
+        {"liked": True, "$or": [
+            {"swiper_id": {"$in": list(liked_ids)}, "swiped_id": swiper_id}
+            for swiper_id, liked_ids in likes.items()
+        ]},
+        {"_id": 0, "swiper_id": 1, "swiped_id": 1}
+    ).to_list(length=None)
+
+    ops: Dict[Tuple[ObjectId, ObjectId], UpdateOne] = {}
+    for swipe in reverse:
+        swiper_id, other_id = swipe["swiped_id"], swipe["swiper_id"]
+        user1_id, user2_id = match_pair(swiper_id, other_id)
+        ops[(user1_id, user2_id)] = UpdateOne(
+            {"user1_id": user1_id, "user2_id": user2_id},
+            {"$setOnInsert": {"created_at": likes[swiper_id][other_id]}},
+            upsert=True
+        )
+    if ops:
+        await matches.bulk_write(list(ops.values()), ordered=False)
+    return len(ops)
+
+
+def backfill_pipeline() -> List[dict]:
+    """
+    Aggregation over ``swipes`` that merges every historic mutual like into ``matches``.
+
+    Only likes from the lower id to the higher one are expanded, so each pair is
+    looked up once; the match is dated by the later of its two likes.
+    """
+    return [
+        {"$match": {"liked": True, "$expr": {"$lt": ["$swiper_id", "$swiped_id"]}}},
+        {"$lookup": {
+            "from": "swipes",
+            "let": {"swiper": "$swiper_id", "swiped": "$swiped_id"},
+            "pipeline": [
+                {"$match": {"$expr": {"$and": [
+                    {"$eq": ["$swiper_id", "$$swiped"]},
+                    {"$eq": ["$swiped_id", "$$swiper"]},
+                ]}, "liked": True}},
+                {"$project": {"_id": 0, "created_at": 1}},
+            ],
+            "as": "reverse",
+        }},
+        {"$match": {"reverse": {"$ne": []}}},
+        {"$project": {
+            "_id": 0,
+            "user1_id": "$swiper_id",
+            "user2_id": "$swiped_id",
+            "created_at": {"$max": ["$created_at", {"$first": "$reverse.created_at"}]},
+        }},
+        {"$merge": {
+            "into": "matches",
+            "on": ["user1_id", "user2_id"],
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+async def backfill_matches(db) -> int:
+    """Compute all historic matches in one aggregation; returns the number of matches afterwards."""
+    await db["swipes"].aggregate(backfill_pipeline()).to_list(length=None)
+    return await db["matches"].count_documents({})
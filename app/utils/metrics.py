@@ -0,0 +1,136 @@
+"""
+Prometheus request metrics.
+
+``LatencyMiddleware`` records a latency histogram per route template and
+status, plus an in-flight request gauge, leaving out Server-Sent Events
+streams; ``monitor_event_loop_lag`` samples
+how late the event loop wakes up from a short sleep.
+
+With several uvicorn/gunicorn workers, set ``PROMETHEUS_MULTIPROC_DIR`` to
+an empty writable directory before the workers start. Each process then
+writes its samples to memory-mapped files there and ``/metrics`` aggregates
+all of them, whichever worker answers the scrape.
+"""
+
+import asyncio
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client import multiprocess
+from app.utils.db_stats import route_template
+
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status code",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served",
+    multiprocess_mode="livesum",
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between a scheduled event loop wake-up and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+SWIPE_BUFFER_DEPTH = Gauge(
+    "swipe_buffer_depth",
+    "Swipes acknowledged but not yet written to MongoDB",
+    multiprocess_mode="livesum",
+)
+
+SWIPE_FLUSH_LATENCY = Histogram(
+    "swipe_buffer_flush_duration_seconds",
+    "Time to write one batch of buffered swipes",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+JOB_DURATION = Histogram(
+    "background_job_duration_seconds",
+    "Duration of background job runs",
+    ["job"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+JOB_RUNS = Counter(
+    "background_job_runs_total",
+    "Background job runs by outcome (ok, error, or skipped when another worker holds the lease)",
+    ["job", "outcome"],
+)
+
+
+def render_metrics():
+    """Return the Prometheus exposition body and its content type."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+async def monitor_event_loop_lag(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """Run forever, observing how late each ``interval`` sleep returns."""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - scheduled))
+
+
+class LatencyMiddleware:
+    """
+    ASGI middleware recording request latency and concurrency.
+
+    Server-Sent Events responses (``text/event-stream``) stay open for as
+    long as the client is connected. They are taken out of the in-flight
+    gauge as soon as their headers go out and never reach the histogram,
+    where a single stream would otherwise land in the top bucket.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        streaming = False
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if _is_event_stream(message.get("headers", [])):
+                    streaming = True
+                    REQUESTS_IN_FLIGHT.dec()
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            if not streaming:
+                REQUESTS_IN_FLIGHT.dec()
+                REQUEST_LATENCY.labels(scope["method"], route_template(scope), str(status)).observe(
+                    time.perf_counter() - start
+                )
+
+
+def _is_event_stream(headers) -> bool:
+    for name, value in headers:
+        if name.lower() == b"content-type":
+            return value.split(b";")[0].strip().lower() == b"text/event-stream"
+    return False
@@ -0,0 +1,144 @@
+"""
+pymongo event listeners used to observe the MongoDB client.
+"""
+
+import threading
+from contextvars import ContextVar
+from typing import Dict, Optional
+from pymongo import monitoring
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Tracks connection pool utilization across every server the client talks to."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.max_checked_out = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.checkouts += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "connections_created": self.connections_created,
+                "connections_closed": self.connections_closed,
+                "pool_clears": self.pool_clears,
+            }
+
+
+class RequestDbStats:
+    """Database work done on behalf of one HTTP request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.round_trips = 0
+        self.documents = 0
+        self.failures = 0
+        self.duration_micros = 0
+
+    def record(self, command_name: str, duration_micros: int, documents: int, failed: bool = False):
+        with self._lock:
+            self.round_trips += 1
+            if command_name != "getMore":
+                self.commands += 1
+            self.documents += documents
+            self.duration_micros += duration_micros
+            if failed:
+                self.failures += 1
+
+    def header_value(self) -> str:
+        return (f"commands={self.commands};round_trips={self.round_trips};"
+                f"docs={self.documents};time_ms={self.duration_micros / 1000:.1f}")
+
+
+# Set by the request middleware. Motor runs pymongo calls on its executor with
+# a copy of the caller's context, so the listener sees the request's object.
+current_db_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("current_db_stats", default=None)
+
+
+def _documents_in_reply(reply) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+        return len(batch) if isinstance(batch, list) else 0
+    values = reply.get("values")
+    if isinstance(values, list):
+        return len(values)
+    value = reply.get("value")
+    return 1 if isinstance(value, dict) else 0
+
+
+class CommandStatsListener(monitoring.CommandListener):
+    """Attributes every command to the request that issued it."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        stats = current_db_stats.get()
+        if stats is not None:
+            stats.record(event.command_name, event.duration_micros, _documents_in_reply(event.reply))
+
+    def failed(self, event):
+        stats = current_db_stats.get()
+        if stats is not None:
+            stats.record(event.command_name, event.duration_micros, 0, failed=True)
@@ -0,0 +1,88 @@
+"""
+Keyset (seek) pagination helpers.
+
+Instead of ``skip``, which makes MongoDB walk and discard every earlier
+document, a page is fetched with a range condition on the sort key of the
+last document already returned. That position is handed to clients as an
+opaque continuation token.
+
+Sort keys may be null or missing. MongoDB orders those before every other
+value, and range operators never match them, so the seek condition treats
+null explicitly: it is the first value in ascending order and the last one
+in descending order.
+"""
+
+import base64
+from typing import Dict, List, Optional, Sequence, Tuple
+from bson import json_util
+
+SortSpec = Sequence[Tuple[str, int]]
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a continuation token cannot be decoded."""
+
+
+def encode_cursor(document: dict, sort: SortSpec) -> str:
+    """Build a continuation token from the sort-key values of ``document``."""
+    position = {field: document.get(field) for field, _ in sort}
+    raw = json_util.dumps(position).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> Dict:
+    """Decode a continuation token produced by ``encode_cursor`` for the same ``sort``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+    if not isinstance(position, dict) or set(position) != {field for field, _ in sort}:
+        raise InvalidCursorError("Cursor does not match the requested ordering")
+    return position
+
+
+def _after(field: str, direction: int, value) -> Optional[Dict]:
+    """Condition for ``field`` sorting strictly after ``value``; None if nothing can."""
+    if direction > 0:
+        # Nulls come first, so everything non-null follows a null
+        return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+    if value is None:
+        return None
+    return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+
+def seek_query(position: Dict, sort: SortSpec) -> Dict:
+    """
+    Return the filter selecting documents strictly after ``position``.
+
+    For a sort on ``(a, b)`` this is ``a > x OR (a == x AND b > y)``, with the
+    comparison flipped for descending fields and nulls placed as MongoDB
+    sorts them.
+    """
+    clauses: List[Dict] = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, position[field])
+        if after is None:
+            continue
+        clause = {prev: position[prev] for prev, _ in sort[:i]}
+        clauses.append({"$and": [clause, after]} if clause else after)
+    if not clauses:
+        # Only reachable if every key is null and descending; _id never is
+        return {"_id": {"$exists": False}}
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def apply_cursor(query: Dict, cursor: Optional[str], sort: SortSpec) -> Dict:
+    """Combine ``query`` with the seek condition for ``cursor``, if any."""
+    if not cursor:
+        return query
+    seek = seek_query(decode_cursor(cursor, sort), sort)
+    return {"$and": [query, seek]} if query else seek
+
+
+def next_cursor(page: List[dict], limit: int, sort: SortSpec) -> Optional[str]:
+    """Return the token for the page after ``page``, or None if it was the last one."""
+    if limit <= 0 or len(page) < limit:
+        return None
+    return encode_cursor(page[-1], sort)
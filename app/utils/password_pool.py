@@ -0,0 +1,87 @@
+"""
+Bounded worker pool for password hashing.
+
+bcrypt is deliberately slow (tens of milliseconds per call) and would block
+the event loop if run inside an ``async def`` handler. Hashing and
+verification are handed to a small thread pool instead; the bcrypt C
+extension releases the GIL, so the loop keeps serving other requests.
+
+The pool admits at most ``PASSWORD_HASH_MAX_PENDING`` calls (running plus
+queued). Anything beyond that is rejected immediately with
+``PoolSaturatedError`` rather than queueing without bound during a login
+burst.
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", "1"))
+
+
+class PoolSaturatedError(Exception):
+    """Raised when the pool's queue-depth limit has been reached."""
+
+
+class BoundedExecutor:
+    """Thread pool that rejects new work once ``max_pending`` calls are in flight."""
+
+    def __init__(self, workers: int, max_pending: int, thread_name_prefix: str = "worker"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix)
+        # Only touched from the event loop thread, so no lock is needed
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run ``fn`` on the pool and await its result."""
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturatedError(f"{self._pending} calls already pending")
+
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        self._pending += 1
+        # Released when the call finishes on its thread, not when the awaiting
+        # coroutine is cancelled: a running bcrypt call cannot be stopped
+        future.add_done_callback(lambda _: self._release_threadsafe(loop))
+        return await asyncio.wrap_future(future)
+
+    def _release_threadsafe(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # The loop is already closed, e.g. during shutdown
+            pass
+
+    def _release(self) -> None:
+        self._pending -= 1
+        self.completed += 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_pool = BoundedExecutor(
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_PENDING,
+    thread_name_prefix="password-hash",
+)
@@ -0,0 +1,111 @@
+"""
+Opt-in profiling of single requests.
+
+Disabled unless ``PROFILING_TOKEN`` is set, in which case ``main`` installs
+``ProfilingMiddleware``; without the token the middleware is not in the
+stack at all, so there is no per-request cost.
+
+A request sent with ``X-Profile: <PROFILING_TOKEN>`` runs under cProfile.
+The profile is written to ``PROFILE_DIR`` as a ``.pstats`` file, whose name
+is returned in ``X-Profile-File``. With ``X-Profile-Format: text`` the
+response body is replaced by a text report of the hottest functions.
+
+cProfile is deterministic and covers the event loop thread, so other
+requests served while this one awaits show up in the profile too; MongoDB
+work running on Motor's executor threads appears only as time spent
+awaiting it. Only one request is profiled at a time; a concurrent request
+asking for a profile runs normally and gets ``X-Profile: busy``.
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import tempfile
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "api-profiles"))
+PROFILE_REPORT_LINES = int(os.getenv("PROFILE_REPORT_LINES", "40"))
+
+
+def _header(scope, name: bytes):
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that present the profiling token."""
+
+    def __init__(self, app, token: str = PROFILING_TOKEN, directory: str = PROFILE_DIR):
+        self.app = app
+        self.token = token
+        self.directory = directory
+        self._active = False
+
+    def _requested(self, scope) -> bool:
+        supplied = _header(scope, b"x-profile")
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if self._active:
+            await self.app(scope, receive, self._with_headers(send, [(b"x-profile", b"busy")]))
+            return
+
+        as_text = (_header(scope, b"x-profile-format") or "").lower() == "text"
+        os.makedirs(self.directory, exist_ok=True)
+        route = re.sub(r"[^A-Za-z0-9_-]+", "_", scope["path"].strip("/"))[:80]
+        filename = f"{int(time.time() * 1000)}-{scope['method']}-{route}.pstats"
+        path = os.path.join(self.directory, filename)
+
+        profiler = cProfile.Profile()
+        self._active = True
+        profiler.enable()
+        try:
+            if as_text:
+                # The original body is discarded in favour of the report
+                await self.app(scope, receive, self._discard)
+            else:
+                await self.app(scope, receive, self._with_headers(send, [(b"x-profile-file", filename.encode())]))
+        finally:
+            profiler.disable()
+            self._active = False
+            profiler.dump_stats(path)
+
+        if as_text:
+            report = io.StringIO()
+            pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_REPORT_LINES)
+            body = report.getvalue().encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"x-profile-file", filename.encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _discard(message):
+        pass
+
+    @staticmethod
+    def _with_headers(send, extra):
+        async def wrapped(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + extra}
+            await send(message)
+        return wrapped
@@ -0,0 +1,186 @@
+"""
+Server push of recommendation updates.
+
+Clients hold a Server-Sent Events stream (``GET /api/profiles/stream``)
+instead of polling. ``PushHub`` keeps, per connected user, the deck of
+recommended profiles last sent to them and a ``refresh`` callback that
+recomputes it. After a recomputation only the difference is pushed, as a
+``recommendations`` event ``{"added": [profiles], "removed": [ids]}``.
+
+Recomputation is driven by swipes rather than by polling: a like changes
+what the user is shown, so it always triggers one; a pass only removes the
+card from the deck, and triggers one once fewer than
+``PUSH_DECK_THRESHOLD`` cards are left. Refreshes for one user never
+overlap; swipes arriving during one cause exactly one more afterwards.
+
+Each worker only knows its own connections. Swipes served by another
+worker reach a stream through the dirty-user set: a scheduler job reads
+(without removing) the marks of this worker's connected users every
+``PUSH_DIRTY_REFRESH_SECONDS`` and refreshes them. Marks older than the
+last time this worker brought the deck up to date (``seen_since``), such
+as those of swipes it handled itself or marks it already acted on, are
+skipped, so each change causes at most one refresh per worker.
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "16"))
+PUSH_DECK_THRESHOLD = int(os.getenv("PUSH_DECK_THRESHOLD", "3"))
+PUSH_KEEPALIVE_SECONDS = float(os.getenv("PUSH_KEEPALIVE_SECONDS", "15"))
+# How often connected users marked dirty by any worker are refreshed
+PUSH_DIRTY_REFRESH_SECONDS = float(os.getenv("PUSH_DIRTY_REFRESH_SECONDS", "5"))
+
+Refresh = Callable[[], Awaitable[List[dict]]]
+
+
+class PushHub:
+    """Per-user event queues and recommendation decks for connected clients."""
+
+    def __init__(self, queue_size: int = PUSH_QUEUE_SIZE, deck_threshold: int = PUSH_DECK_THRESHOLD):
+        self.queue_size = queue_size
+        self.deck_threshold = deck_threshold
+        self._queues: Dict[str, Set[asyncio.Queue]] = {}
+        self._refreshers: Dict[str, Refresh] = {}
+        self._decks: Dict[str, Dict[str, dict]] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._stale: Set[str] = set()
+        # Per user, when this worker last accounted for every change in the deck
+        self._seen_at: Dict[str, datetime] = {}
+        self.published = 0
+        self.dropped = 0
+        self.refreshes = 0
+
+    def connected(self, user_id) -> bool:
+        return str(user_id) in self._queues
+
+    def connected_users(self) -> List[str]:
+        return list(self._queues)
+
+    @asynccontextmanager
+    async def subscribe(self, user_id, refresh: Refresh):
+        """Register a connection of ``user_id``; yields the queue its events arrive on."""
+        user_id = str(user_id)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues.setdefault(user_id, set()).add(queue)
+        self._refreshers[user_id] = refresh
+        try:
+            yield queue
+        finally:
+            queues = self._queues.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._queues[user_id]
+                    self._refreshers.pop(user_id, None)
+                    self._decks.pop(user_id, None)
+                    self._stale.discard(user_id)
+                    self._seen_at.pop(user_id, None)
+
+    def publish(self, user_id, event: str, data) -> None:
+        """Queue an event for every connection of ``user_id``, dropping the oldest one if a client lags."""
+        for queue in self._queues.get(str(user_id), ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait((event, data))
+            self.published += 1
+
+    def snapshot(self, user_id) -> Optional[dict]:
+        """The current deck as one event payload, for a connection that just joined; None if not built yet."""
+        deck = self._decks.get(str(user_id))
+        if deck is None:
+            return None
+        return {"added": list(deck.values()), "removed": [], "size": len(deck)}
+
+    async def refresh(self, user_id) -> None:
+        """Recompute the deck of ``user_id`` and push what changed."""
+        user_id = str(user_id)
+        refresher = self._refreshers.get(user_id)
+        if refresher is None:
+            return
+        # The recomputation reads everything changed before this point
+        self._seen_at[user_id] = datetime.utcnow()
+        profiles = await refresher()
+        self.refreshes += 1
+        if not self.connected(user_id):
+            return
+
+        old = self._decks.get(user_id, {})
+        new = {str(profile["_id"]): profile for profile in profiles}
+        self._decks[user_id] = new
+        added = [profile for profile_id, profile in new.items() if profile_id not in old]
+        removed = [profile_id for profile_id in old if profile_id not in new]
+        if added or removed:
+            self.publish(user_id, "recommendations", {"added": added, "removed": removed, "size": len(new)})
+
+    def schedule_refresh(self, user_id) -> None:
+        """Refresh in the background, at most one run per user at a time."""
+        user_id = str(user_id)
+        if not self.connected(user_id):
+            return
+        if user_id in self._refreshing:
+            self._stale.add(user_id)
+            return
+        self._refreshing[user_id] = asyncio.create_task(self._refresh_until_fresh(user_id))
+
+    async def _refresh_until_fresh(self, user_id: str) -> None:
+        try:
+            while True:
+                self._stale.discard(user_id)
+                try:
+                    await self.refresh(user_id)
+                except Exception as e:
+                    logger.error(f"Failed to refresh pushed recommendations for {user_id}: {e}")
+                if user_id not in self._stale:
+                    break
+        finally:
+            self._refreshing.pop(user_id, None)
+
+    def swiped(self, user_id, swipes: Iterable[Tuple[object, bool]]) -> None:
+        """Take swiped cards off the deck of ``user_id`` and refresh if needed."""
+        user_id = str(user_id)
+        if not self.connected(user_id):
+            return
+        deck = self._decks.get(user_id, {})
+        liked_any = False
+        for swiped_id, liked in swipes:
+            deck.pop(str(swiped_id), None)
+            liked_any = liked_any or liked
+        # A refresh already running may have read the swipes before these, so it runs again
+        if liked_any or len(deck) < self.deck_threshold or user_id in self._refreshing:
+            self.schedule_refresh(user_id)
+        # Either the refresh or the removal above covers these swipes
+        self._seen_at[user_id] = datetime.utcnow()
+
+    def seen_since(self, user_id, changed_at: datetime) -> bool:
+        """Whether this worker already brought the deck of ``user_id`` up to date after ``changed_at``."""
+        seen_at = self._seen_at.get(str(user_id))
+        return seen_at is not None and seen_at >= changed_at
+
+    def close(self) -> None:
+        """Cancel refreshes still running, on shutdown."""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self._queues),
+            "connections": sum(len(queues) for queues in self._queues.values()),
+            "refreshing": len(self._refreshing),
+            "refreshes": self.refreshes,
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+push_hub = PushHub()
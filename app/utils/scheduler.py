@@ -0,0 +1,194 @@
+"""
+In-process scheduler for periodic background jobs.
+
+Jobs are registered with ``scheduler.register(name, func, interval)`` and
+run on the event loop every ``interval`` seconds, spread by a random
+``jitter`` (a fraction of the interval) so workers started together do not
+run in lockstep.
+
+By default every worker runs its own copy of a job, which is what jobs
+maintaining in-process state need. A job registered with ``exclusive=True``
+runs in only one worker per interval across all processes and hosts: before
+each run the worker takes a lease document in ``job_leases``
+(``{_id: job name, owner, expires_at}``). The lease lasts one interval and
+is extended while the job is still running, so a slow run is never
+duplicated and the other workers skip their ticks in the meantime.
+
+Every run is recorded in the ``background_job_duration_seconds`` histogram
+and the ``background_job_runs_total`` counter (outcome ``ok``, ``error`` or
+``skipped``).
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+from app.utils.metrics import JOB_DURATION, JOB_RUNS
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_JITTER = float(os.getenv("SCHEDULER_JITTER", "0.1"))
+
+
+class Job:
+    """A registered job and its run statistics."""
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[None]], interval: float,
+                 jitter: float, exclusive: bool, lease_seconds: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.exclusive = exclusive
+        self.lease_seconds = lease_seconds
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_started: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def next_delay(self) -> float:
+        return max(0.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "interval": self.interval,
+            "exclusive": self.exclusive,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_started": self.last_started,
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """Runs registered jobs periodically; exclusive ones under a MongoDB lease."""
+
+    def __init__(self, owner: Optional[str] = None):
+        self.owner = owner
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._leases = None
+        self._started = False
+
+    def register(self, name: str, func: Callable[[], Awaitable[None]], interval: float,
+                 jitter: float = SCHEDULER_JITTER, exclusive: bool = False,
+                 lease_seconds: Optional[float] = None) -> Job:
+        """Add a job; ``func`` is a coroutine function taking no arguments."""
+        if name in self._jobs:
+            raise ValueError(f"Job {name} is already registered")
+        job = Job(name, func, interval, jitter, exclusive, lease_seconds or interval)
+        self._jobs[name] = job
+        if self._started:
+            self._tasks[name] = asyncio.create_task(self._loop(job))
+        return job
+
+    def start(self, leases=None) -> None:
+        """Start every job from the running event loop; ``leases`` is the job_leases collection."""
+        # Named here rather than at import, which may happen in a gunicorn master before forking
+        self.owner = self.owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._leases = leases
+        self._started = True
+        for name, job in self._jobs.items():
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._loop(job))
+
+    async def stop(self) -> None:
+        self._started = False
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _loop(self, job: Job) -> None:
+        # First run soon after startup, spread over the jitter window
+        await asyncio.sleep(random.uniform(0, job.interval * job.jitter))
+        while True:
+            await self.run(job.name)
+            await asyncio.sleep(job.next_delay())
+
+    async def run(self, name: str) -> bool:
+        """Run a job now (if its lease can be had); True if it ran and succeeded."""
+        job = self._jobs[name]
+        if job.exclusive and not await self._acquire(job):
+            job.skipped += 1
+            JOB_RUNS.labels(job.name, "skipped").inc()
+            return False
+
+        renewer = asyncio.create_task(self._renew(job)) if job.exclusive and self._leases is not None else None
+        job.last_started = time.time()
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            await job.func()
+            job.last_error = None
+        except Exception as e:
+            outcome = "error"
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"Background job {job.name} failed: {e}")
+        finally:
+            if renewer is not None:
+                renewer.cancel()
+            job.runs += 1
+            job.last_duration = time.perf_counter() - start
+            JOB_DURATION.labels(job.name).observe(job.last_duration)
+            JOB_RUNS.labels(job.name, outcome).inc()
+        return outcome == "ok"
+
+    async def _acquire(self, job: Job) -> bool:
+        """Take the job's lease if it is free, expired or already ours."""
+        if self._leases is None:
+            return True
+        now = datetime.utcnow()
+        try:
+            await self._leases.update_one(
+                {"_id": job.name, "$or": [{"expires_at": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {
+                    "owner": self.owner,
+                    "acquired_at": now,
+                    "expires_at": now + timedelta(seconds=job.lease_seconds),
+                }},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # The lease exists and another worker holds it
+            return False
+        except Exception as e:
+            logger.error(f"Could not take the lease for job {job.name}: {e}")
+            return False
+
+    async def _renew(self, job: Job) -> None:
+        """Keep extending the lease while the job runs."""
+        while True:
+            await asyncio.sleep(job.lease_seconds / 3)
+            try:
+                await self._leases.update_one(
+                    {"_id": job.name, "owner": self.owner},
+                    {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=job.lease_seconds)}}
+                )
+            except Exception as e:
+                logger.error(f"Could not renew the lease for job {job.name}: {e}")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "owner": self.owner,
+            "jobs": {name: job.stats() for name, job in self._jobs.items()},
+        }
+
+
+scheduler = Scheduler()
@@ -0,0 +1,25 @@
+"""
+Normalized keys for indexed, case-insensitive prefix search.
+
+A case-insensitive regex cannot use tight index bounds, so fields searched
+by prefix are stored a second time as a key: trimmed and lowercased
+(``location_key`` for users, ``title_key`` for recommendations; ``init_db``
+backfills both with ``$trim``/``$toLower``). A prefix search is then an
+anchored, case-sensitive regex on the key, which MongoDB answers with an
+index range scan.
+"""
+
+import re
+from typing import Optional
+
+
+def normalize_key(value) -> Optional[str]:
+    """Return the search key for a raw field value, or None if it is not a string."""
+    if not isinstance(value, str):
+        return None
+    return value.strip().lower()
+
+
+def prefix_query(value: str) -> dict:
+    """Filter on a normalized key field matching keys that start with ``value``."""
+    return {"$regex": "^" + re.escape(normalize_key(value) or "")}
@@ -0,0 +1,75 @@
+"""
+Request coalescing ("single flight").
+
+``single_flight.do(key, fn, ...)`` runs ``fn`` once per key at a time: a
+caller arriving while a computation for the same key is in progress awaits
+that one and gets the same result (or exception) instead of starting its
+own. Nothing is kept once the computation finishes; this only merges
+concurrent work, it is not a cache.
+
+Keys for per-user results include the user's swipe version from
+``swipe_versions``, which every new swipe bumps. A request made after a
+swipe therefore never joins a computation that started before it.
+"""
+
+import asyncio
+import itertools
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable
+from dotenv import load_dotenv
+from app.utils.cache import TTLCache
+
+load_dotenv()
+
+SWIPE_VERSION_TTL_SECONDS = float(os.getenv("SWIPE_VERSION_TTL_SECONDS", "3600"))
+SWIPE_VERSION_MAX_SIZE = int(os.getenv("SWIPE_VERSION_MAX_SIZE", "100000"))
+
+
+class SingleFlight:
+    """Deduplicates concurrent calls that share a key."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+        # A caller that disconnects must not cancel the work the others wait for
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "shared": self.shared,
+        }
+
+
+class SwipeVersions:
+    """Per-user counter bumped on every swipe, for use in single-flight keys."""
+
+    def __init__(self, max_size: int, ttl: float):
+        # Versions come from one process-wide sequence, so a user whose entry
+        # expired can never get back a version an older computation used
+        self._sequence = itertools.count(1)
+        self._versions = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, user_id) -> int:
+        return self._versions.get(str(user_id), 0)
+
+    def bump(self, user_id) -> int:
+        version = next(self._sequence)
+        self._versions.set(str(user_id), version)
+        return version
+
+
+single_flight = SingleFlight()
+swipe_versions = SwipeVersions(SWIPE_VERSION_MAX_SIZE, SWIPE_VERSION_TTL_SECONDS)
@@ -0,0 +1,234 @@
+"""
+Write-behind buffer for swipes.
+
+With ``SWIPE_WRITE_BEHIND=true`` a swipe is acknowledged once it is queued
+here; a background task writes queued swipes to MongoDB with one unordered
+``insert_many`` per batch, as soon as ``SWIPE_FLUSH_BATCH_SIZE`` swipes are
+waiting or ``SWIPE_FLUSH_INTERVAL_MS`` after the last flush, whichever comes
+first.
+
+The queue is keyed by ``(swiper_id, swiped_id)``, so it doubles as the dedupe
+set, and holds at most ``SWIPE_BUFFER_MAX_SIZE`` swipes; beyond that ``add``
+raises ``BufferFullError`` and the caller answers 503. Swipes stay in the
+queue until their batch is written, so ``pending_for`` (the overlay the
+profile endpoints merge with what is already in MongoDB) also covers the
+batch currently being flushed.
+
+Callers check MongoDB for an existing swipe before ``add``; one that still
+slips through (a concurrent direct write) is dropped when its batch hits the
+unique index. Anything still queued is written by ``stop()``, which runs
+from ``close_db`` on shutdown.
+
+The queue and the ``pending_for`` overlay live in one process. Another
+worker would neither see a swipe queued here nor dedupe against it, so
+write-behind needs a single worker: with ``WEB_CONCURRENCY`` above 1
+``write_behind_enabled()`` logs an error and swipes are written directly.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from itertools import islice
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError
+from app.utils.admission import LazyPrimitive
+from app.utils.metrics import SWIPE_BUFFER_DEPTH, SWIPE_FLUSH_LATENCY
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SWIPE_WRITE_BEHIND = os.getenv("SWIPE_WRITE_BEHIND", "false").lower() == "true"
+SWIPE_BUFFER_MAX_SIZE = int(os.getenv("SWIPE_BUFFER_MAX_SIZE", "10000"))
+SWIPE_FLUSH_BATCH_SIZE = int(os.getenv("SWIPE_FLUSH_BATCH_SIZE", "500"))
+SWIPE_FLUSH_INTERVAL_MS = int(os.getenv("SWIPE_FLUSH_INTERVAL_MS", "200"))
+SWIPE_BUFFER_RETRY_AFTER = int(os.getenv("SWIPE_BUFFER_RETRY_AFTER", "1"))
+# Set by gunicorn.conf.py for every worker; unset means a single process
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Server error code for a unique index violation
+DUPLICATE_KEY = 11000
+
+
+def write_behind_enabled() -> bool:
+    """Whether to start the buffer: SWIPE_WRITE_BEHIND, and only with one worker."""
+    if not SWIPE_WRITE_BEHIND:
+        return False
+    if WEB_CONCURRENCY > 1:
+        logger.error(
+            f"SWIPE_WRITE_BEHIND needs a single worker but WEB_CONCURRENCY={WEB_CONCURRENCY}; "
+            "writing swipes directly instead"
+        )
+        return False
+    return True
+
+
+class BufferFullError(Exception):
+    """Raised when the buffer already holds ``max_size`` swipes."""
+
+
+class SwipeBuffer:
+    """Bounded, deduplicating queue of swipes flushed to MongoDB in batches."""
+
+    def __init__(self, max_size: int, batch_size: int, interval: float):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        # Insertion-ordered, so it is also the flush queue
+        self._queue: Dict[Tuple[ObjectId, ObjectId], dict] = {}
+        self._by_swiper: Dict[ObjectId, Dict[ObjectId, bool]] = {}
+        self._collection = None
+        self._on_flush: Optional[Callable[[List[dict]], Awaitable[None]]] = None
+        self._task: Optional[asyncio.Task] = None
+        # Created by start(), see LazyPrimitive
+        self._wake = LazyPrimitive(asyncio.Event)
+        self._flush_lock = LazyPrimitive(asyncio.Lock)
+        self.accepted = 0
+        self.rejected = 0
+        self.duplicates = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def add(self, record: dict) -> bool:
+        """Queue a swipe record; False if the same swipe is already queued."""
+        key = (record["swiper_id"], record["swiped_id"])
+        if key in self._queue:
+            self.duplicates += 1
+            return False
+        if len(self._queue) >= self.max_size:
+            self.rejected += 1
+            raise BufferFullError(f"{len(self._queue)} swipes already queued")
+
+        record.setdefault("_id", ObjectId())
+        self._queue[key] = record
+        self._by_swiper.setdefault(record["swiper_id"], {})[record["swiped_id"]] = record["liked"]
+        self.accepted += 1
+        SWIPE_BUFFER_DEPTH.set(len(self._queue))
+        if len(self._queue) >= self.batch_size and self._wake.created:
+            self._wake.get().set()
+        return True
+
+    def pending_for(self, swiper_id: ObjectId) -> Dict[ObjectId, bool]:
+        """Queued swipes of one user, as swiped_id -> liked."""
+        return dict(self._by_swiper.get(swiper_id, {}))
+
+    def _discard(self, keys) -> None:
+        for key in keys:
+            if self._queue.pop(key, None) is None:
+                continue
+            swiper_id, swiped_id = key
+            swiped = self._by_swiper.get(swiper_id)
+            if swiped is not None:
+                swiped.pop(swiped_id, None)
+                if not swiped:
+                    del self._by_swiper[swiper_id]
+        SWIPE_BUFFER_DEPTH.set(len(self._queue))
+
+    async def flush(self) -> int:
+        """Write one batch; returns how many swipes left the queue."""
+        if not self._flush_lock.created:
+            # Never started, so there is nowhere to write to
+            return 0
+        async with self._flush_lock.get():
+            batch = list(islice(self._queue.items(), self.batch_size))
+            if not batch or self._collection is None:
+                return 0
+
+            records = [record for _, record in batch]
+            start = time.perf_counter()
+            try:
+                await self._collection.insert_many(records, ordered=False)
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                failed = {err["index"] for err in write_errors}
+                records = [record for i, record in enumerate(records) if i not in failed]
+                errors = [err for err in write_errors if err.get("code") != DUPLICATE_KEY]
+                if errors:
+                    logger.error(f"Dropped {len(errors)} buffered swipes: {errors[0].get('errmsg')}")
+            except Exception as e:
+                # Keep the batch queued and try again on the next tick
+                self.failed_flushes += 1
+                logger.error(f"Failed to flush {len(batch)} buffered swipes: {e}")
+                return 0
+            finally:
+                SWIPE_FLUSH_LATENCY.observe(time.perf_counter() - start)
+
+            self._discard(key for key, _ in batch)
+            self.flushed += len(batch)
+            if self._on_flush is not None and records:
+                try:
+                    await self._on_flush(records)
+                except Exception as e:
+                    logger.error(f"Error after flushing buffered swipes: {e}")
+            return len(batch)
+
+    async def _run(self) -> None:
+        wake = self._wake.get()
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            wake.clear()
+            while await self.flush() >= self.batch_size:
+                pass
+
+    def start(self, collection, on_flush: Optional[Callable[[List[dict]], Awaitable[None]]] = None) -> None:
+        """
+        Start flushing into ``collection`` from the running event loop.
+
+        ``on_flush`` is awaited with the records of each batch that were
+        actually inserted.
+        """
+        self._collection = collection
+        self._on_flush = on_flush
+        self._wake.get()
+        self._flush_lock.get()
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write everything still queued."""
+        if self._task is not None:
+            # Never cancel a batch half-way through its insert
+            async with self._flush_lock.get():
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue and await self.flush():
+            pass
+        if self._queue:
+            logger.error(f"{len(self._queue)} buffered swipes could not be written on shutdown")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enabled": self.running,
+            "depth": len(self._queue),
+            "max_size": self.max_size,
+            "batch_size": self.batch_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "duplicates": self.duplicates,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+swipe_buffer = SwipeBuffer(
+    SWIPE_BUFFER_MAX_SIZE,
+    SWIPE_FLUSH_BATCH_SIZE,
+    SWIPE_FLUSH_INTERVAL_MS / 1000,
+)
@@ -0,0 +1,132 @@
+"""
+Denormalized swipe counters on user documents.
+
+Every stored swipe bumps ``swipes_received`` (and, for a like,
+``likes_received``) on the swiped profile and ``likes_given`` on the swiper.
+``like_rate`` is recomputed in the same update so it always agrees with the
+counters. It is smoothed towards ``LIKE_RATE_PRIOR`` by
+``LIKE_RATE_PRIOR_SWIPES`` virtual swipes, so a profile liked once out of
+one swipe does not outrank one liked 80 times out of 100.
+
+Each update is a single-document pipeline update, which MongoDB applies
+atomically just like ``$inc``. The counters are part of the profile served
+with ETags (``app.utils.conditional``), so every update that changes them
+also sets ``updated_at``. ``reconcile_counters`` recounts everything
+from the swipes collection when the counters may have drifted, e.g. after
+swipes were deleted by hand.
+"""
+
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LIKE_RATE_PRIOR = float(os.getenv("LIKE_RATE_PRIOR", "0.5"))
+LIKE_RATE_PRIOR_SWIPES = float(os.getenv("LIKE_RATE_PRIOR_SWIPES", "10"))
+# Recount all counters this often in one worker (0 disables the job)
+SWIPE_COUNTERS_RECONCILE_SECONDS = float(os.getenv("SWIPE_COUNTERS_RECONCILE_SECONDS", "0"))
+
+COUNTER_FIELDS = ("likes_received", "swipes_received", "likes_given")
+RECOUNTED_FIELDS = COUNTER_FIELDS + ("like_rate",)
+
+
+def like_rate_expression(likes="$likes_received", swipes="$swipes_received") -> dict:
+    return {"$divide": [
+        {"$add": [likes, LIKE_RATE_PRIOR * LIKE_RATE_PRIOR_SWIPES]},
+        {"$add": [swipes, LIKE_RATE_PRIOR_SWIPES]},
+    ]}
+
+
+def initial_counters() -> dict:
+    """Counter fields for a newly created user."""
+    return {**{field: 0 for field in COUNTER_FIELDS}, "like_rate": LIKE_RATE_PRIOR}
+
+
+def _increment(user_id, deltas: Dict[str, int], now: datetime) -> UpdateOne:
+    return UpdateOne({"_id": user_id}, [
+        {"$set": {
+            field: {"$add": [{"$ifNull": [f"${field}", 0]}, deltas.get(field, 0)]}
+            for field in COUNTER_FIELDS
+        }},
+        {"$set": {"like_rate": like_rate_expression(), "updated_at": now}},
+    ])
+
+
+def _unchanged(new: Dict[str, object]) -> dict:
+    """Expression that is true when the document already holds the ``new`` counter values."""
+    return {"$and": [{"$eq": [f"${field}", value]} for field, value in new.items()]}
+
+
+def counter_updates(records: Iterable[dict]) -> List[UpdateOne]:
+    """One update per affected user for a group of newly stored swipes."""
+    now = datetime.utcnow()
+    deltas: Dict[object, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for record in records:
+        deltas[record["swiped_id"]]["swipes_received"] += 1
+        if record["liked"]:
+            deltas[record["swiped_id"]]["likes_received"] += 1
+            deltas[record["swiper_id"]]["likes_given"] += 1
+    return [_increment(user_id, user_deltas, now) for user_id, user_deltas in deltas.items()]
+
+
+async def apply_counters(users, records: Iterable[dict]) -> None:
+    """Bump the counters for ``records``, which must already be stored."""
+    updates = counter_updates(records)
+    if updates:
+        await users.bulk_write(updates, ordered=False)
+
+
+def reconcile_pipeline(stamp: datetime) -> List[dict]:
+    """Aggregation over ``swipes`` that recounts every counter and merges it into ``users``."""
+    return [
+        {"$group": {
+            "_id": "$swiped_id",
+            "swipes_received": {"$sum": 1},
+            "likes_received": {"$sum": {"$cond": ["$liked", 1, 0]}},
+        }},
+        {"$unionWith": {"coll": "swipes", "pipeline": [
+            {"$match": {"liked": True}},
+            {"$group": {"_id": "$swiper_id", "likes_given": {"$sum": 1}}},
+        ]}},
+        {"$group": {
+            "_id": "$_id",
+            **{field: {"$sum": {"$ifNull": [f"${field}", 0]}} for field in COUNTER_FIELDS},
+        }},
+        {"$set": {"like_rate": like_rate_expression()}},
+        {"$merge": {"into": "users", "on": "_id", "whenNotMatched": "discard", "whenMatched": [
+            # Only users whose counters actually changed get a new updated_at (and ETag)
+            {"$set": {
+                "updated_at": {"$cond": [
+                    _unchanged({field: f"$$new.{field}" for field in RECOUNTED_FIELDS}), "$updated_at", stamp
+                ]},
+                **{field: f"$$new.{field}" for field in RECOUNTED_FIELDS},
+                "counters_reconciled_at": stamp,
+            }},
+        ]}},
+    ]
+
+
+async def reconcile_counters(db) -> int:
+    """
+    Recount the counters of every user from ``swipes``; returns how many users had no swipes.
+
+    Swipes stored while the aggregation runs may be counted twice or not at
+    all; run it off-peak or simply run it again.
+    """
+    stamp = datetime.utcnow()
+    await db["swipes"].aggregate(reconcile_pipeline(stamp)).to_list(length=None)
+    # Users the aggregation did not touch have no swipes at all
+    initial = initial_counters()
+    result = await db["users"].update_many(
+        {"counters_reconciled_at": {"$ne": stamp}},
+        [{"$set": {
+            "updated_at": {"$cond": [_unchanged(initial), "$updated_at", stamp]},
+            **initial,
+            "counters_reconciled_at": stamp,
+        }}]
+    )
+    return result.modified_count
@@ -0,0 +1,74 @@
+"""
+Cache of user documents for the authentication dependency.
+
+``get_current_user`` runs on every authenticated request, so the user
+document it loads is kept in a small TTL/LRU cache keyed by the token
+subject (the user's ``_id`` as a string). Entries are dropped whenever the
+user is updated through the API, and ``USER_CACHE_TTL_SECONDS`` bounds how
+stale a document changed outside the API (scripts, other workers) can be.
+
+Setting ``AUTH_USER_SOURCE=claims`` additionally lets the swipe and
+recommendation endpoints read the filter fields straight from the JWT,
+skipping the lookup altogether. Those values may then be as old as the
+token itself (``ACCESS_TOKEN_EXPIRE_MINUTES``).
+"""
+
+import os
+from typing import Optional
+from bson import ObjectId
+from dotenv import load_dotenv
+from app.utils.cache import TTLCache
+
+load_dotenv()
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# "db" loads the user document (through the cache); "claims" trusts the
+# filter fields embedded in the access token where an endpoint allows it.
+AUTH_USER_SOURCE = os.getenv("AUTH_USER_SOURCE", "db").lower()
+
+# User fields copied into the access token for the "claims" mode
+CLAIM_FIELDS = ("gender", "preferred_gender", "age")
+
+user_cache = TTLCache(max_size=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+
+async def get_user_by_id(users, user_id: str) -> Optional[dict]:
+    """Return the user document for ``user_id``, reading through the cache."""
+    key = str(user_id)
+    cached = user_cache.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    user = await users.find_one({"_id": ObjectId(key)})
+    if user is not None:
+        user_cache.set(key, user)
+        return dict(user)
+    return None
+
+
+def invalidate_user(user_id) -> None:
+    """Drop the cached document for ``user_id`` after it has been modified."""
+    user_cache.pop(str(user_id))
+
+
+def user_claims(user: dict) -> dict:
+    """Return the filter fields of ``user`` to embed in an access token."""
+    return {field: user.get(field) for field in CLAIM_FIELDS if user.get(field) is not None}
+
+
+def principal_from_claims(payload: dict) -> Optional[dict]:
+    """
+    Build a minimal user dict from token claims.
+
+    Returns None when the token predates the claims mode and lacks any of
+    the required fields, so the caller can fall back to a lookup.
+    """
+    if AUTH_USER_SOURCE != "claims":
+        return None
+    if any(field not in payload for field in CLAIM_FIELDS):
+        return None
+    principal = {field: payload[field] for field in CLAIM_FIELDS}
+    principal["_id"] = ObjectId(payload["sub"])
+    return principal
@@ -1,9 +1,10 @@
 from pymongo import MongoClient
 from bson import ObjectId
+from app.database import MONGODB_URL, DB_NAME
 
-# Connect to MongoDB
-client = MongoClient('mongodb://localhost:27017')
-db = client['recommendation_system']
+# Connect to the database the app uses (MONGODB_URL, DB_NAME)
+client = MongoClient(MONGODB_URL)
+db = client[DB_NAME]
 
 # Count total users
 total_users = db.users.count_documents({})
@@ -0,0 +1,49 @@
+# Production server settings: python run.py --prod
+# (or: gunicorn -c gunicorn.conf.py app.main:app)
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Exported so the app can refuse per-process features such as SWIPE_WRITE_BEHIND
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master so workers share those pages
+# copy-on-write instead of each importing its own
+preload_app = True
+
+# Connection handling
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+backlog = int(os.getenv("BACKLOG", "2048"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+
+# Recycle workers gracefully after a number of requests to bound memory growth;
+# the jitter keeps them from all restarting at once
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", "1000"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+# Prometheus multiprocess mode needs its directory before the app imports
+# prometheus_client, and no metric files left from a previous run. The
+# directory may be supplied by the operator, so only those files are removed.
+if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(), "prometheus-multiproc")
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(path)
+
+
+def on_starting(server):
+    # Runs in the master before any worker is forked, so the ML modules are
+    # imported once and shared instead of once per worker
+    if os.getenv("ML_WARMUP", "false").lower() == "true":
+        from app.ml.warmup import warm_up
+        warm_up()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,3 +1,5 @@
+import argparse
+import os
 import uvicorn
 import sys
 from pathlib import Path
@@ -7,4 +9,16 @@ app_dir = Path(__file__).parent
 sys.path.append(str(app_dir))
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Start the API server")
+    parser.add_argument("--prod", action="store_true",
+                        help="run preforked gunicorn workers with settings from gunicorn.conf.py")
+    parser.add_argument("--workers", type=int, help="number of worker processes in --prod mode")
+    args = parser.parse_args()
+
+    if args.prod:
+        if args.workers:
+            os.environ["WEB_CONCURRENCY"] = str(args.workers)
+        os.chdir(app_dir)
+        os.execvp("gunicorn", ["gunicorn", "-c", "gunicorn.conf.py", "app.main:app"])
+    else:
+        uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
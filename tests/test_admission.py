@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from app.utils.admission import (
+    AdmissionController, AdmissionRejectedError, DeadlineExceededError, busy_response, deadline,
+    max_time_ms, mongo_time_limit, remaining
+)
+
+
+def test_rejects_once_slots_and_queue_are_full():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert (controller.active, controller.waiting) == (1, 1)
+
+        with pytest.raises(AdmissionRejectedError):
+            async with controller.admit():
+                pass
+        assert controller.rejected == 1
+
+        release.set()
+        await asyncio.gather(running, queued)
+        assert controller.stats()["admitted"] == 2
+        assert (controller.active, controller.waiting) == (0, 0)
+
+    asyncio.run(scenario())
+
+
+def test_waiting_past_the_deadline_times_out():
+    async def scenario():
+        controller = AdmissionController("test", limit=1, max_queue=5)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with deadline(10):
+            with pytest.raises(DeadlineExceededError):
+                async with controller.admit():
+                    pass
+        assert controller.timed_out == 1
+        assert controller.waiting == 0
+
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+
+
+def test_deadline_budget():
+    assert remaining() is None
+    assert mongo_time_limit() == {}
+    with deadline(5000):
+        assert 0 < remaining() <= 5
+        assert 1 <= max_time_ms() <= 5000
+        assert set(mongo_time_limit()) == {"maxTimeMS"}
+    with deadline(None):
+        assert remaining() is None
+
+
+def test_busy_response():
+    error = busy_response(3)
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "3"}
@@ -0,0 +1,62 @@
+from app.utils.cache import TTLCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_entry_expires_after_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=30, clock=clock)
+    cache.set("a", 1)
+
+    clock.now += 29
+    assert cache.get("a") == 1
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_expires_at_is_capped_by_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=30, clock=clock)
+    cache.set("short", 1, expires_at=clock.now + 5)
+    cache.set("long", 2, expires_at=clock.now + 3600)
+
+    clock.now += 5
+    assert cache.get("short") is None
+    clock.now += 25
+    assert cache.get("long") is None
+
+
+def test_already_expired_entry_is_not_stored():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=30, clock=clock)
+    cache.set("a", 1, expires_at=clock.now)
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl=30, clock=FakeClock())
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_zero_ttl_disables_cache():
+    cache = TTLCache(max_size=10, ttl=0, clock=FakeClock())
+    cache.set("a", 1)
+    assert cache.get("a", "default") == "default"
+    assert cache.stats()["misses"] == 0
@@ -0,0 +1,82 @@
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import Request
+
+from app.utils.conditional import (
+    document_validators, is_conditional, is_not_modified, list_validators, not_modified
+)
+
+UPDATED_AT = datetime(2024, 5, 1, 12, 30, 15, 250000)
+
+
+def make_request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def make_doc(**fields) -> dict:
+    return {"_id": ObjectId("65f000000000000000000001"), "updated_at": UPDATED_AT, **fields}
+
+
+def test_document_etag_follows_updated_at():
+    etag, last_modified = document_validators(make_doc())
+
+    assert etag.startswith('W/"')
+    assert last_modified == UPDATED_AT
+    assert document_validators(make_doc(name="other fields do not matter"))[0] == etag
+    assert document_validators(make_doc(updated_at=datetime(2024, 5, 2)))[0] != etag
+
+
+def test_document_without_updated_at_has_no_validators():
+    assert document_validators({"_id": ObjectId()}) == (None, None)
+
+
+def test_list_etag_depends_on_items_and_order():
+    first, second = make_doc(), {"_id": ObjectId(), "updated_at": UPDATED_AT}
+
+    assert list_validators([first, second]) == list_validators([first, second])
+    assert list_validators([first, second])[0] != list_validators([second, first])[0]
+    assert list_validators([first])[1] is None
+
+
+def test_if_none_match_matches_weakly_and_in_lists():
+    validators = document_validators(make_doc())
+    etag = validators[0]
+    strong = etag[2:]
+
+    assert is_not_modified(make_request(if_none_match=etag), validators)
+    assert is_not_modified(make_request(if_none_match=strong), validators)
+    assert is_not_modified(make_request(if_none_match=f'"other", {etag}'), validators)
+    assert is_not_modified(make_request(if_none_match="*"), validators)
+    assert not is_not_modified(make_request(if_none_match='W/"other"'), validators)
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    validators = document_validators(make_doc())
+    request = make_request(if_none_match='W/"other"', if_modified_since="Wed, 01 May 2024 12:30:15 GMT")
+
+    assert not is_not_modified(request, validators)
+
+
+def test_if_modified_since_ignores_sub_second_precision():
+    validators = document_validators(make_doc())
+
+    assert is_not_modified(make_request(if_modified_since="Wed, 01 May 2024 12:30:15 GMT"), validators)
+    assert not is_not_modified(make_request(if_modified_since="Wed, 01 May 2024 12:30:14 GMT"), validators)
+    assert not is_not_modified(make_request(if_modified_since="yesterday"), validators)
+
+
+def test_is_conditional():
+    assert is_conditional(make_request(if_none_match='W/"x"'))
+    assert is_conditional(make_request(if_modified_since="Wed, 01 May 2024 12:30:15 GMT"))
+    assert not is_conditional(make_request())
+
+
+def test_not_modified_response_carries_validators():
+    validators = document_validators(make_doc())
+    response = not_modified(validators)
+
+    assert response.status_code == 304
+    assert response.headers["etag"] == validators[0]
+    assert response.headers["last-modified"] == "Wed, 01 May 2024 12:30:15 GMT"
@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.utils.pagination import (
+    InvalidCursorError, apply_cursor, decode_cursor, encode_cursor, next_cursor, seek_query
+)
+
+BY_AGE = [("age", 1), ("_id", 1)]
+BY_SCORE_DESC = [("score", -1), ("_id", 1)]
+
+
+def test_cursor_round_trip():
+    oid = ObjectId()
+    created_at = datetime(2024, 5, 1, 12, 30)
+    sort = [("created_at", -1), ("_id", 1)]
+    token = encode_cursor({"_id": oid, "created_at": created_at, "name": "ignored"}, sort)
+
+    assert "=" not in token
+    assert decode_cursor(token, sort) == {"created_at": created_at, "_id": oid}
+
+
+def test_decode_rejects_garbage():
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not a cursor!", BY_AGE)
+
+
+def test_decode_rejects_cursor_for_another_ordering():
+    token = encode_cursor({"_id": ObjectId(), "age": 30}, BY_AGE)
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(token, [("_id", 1)])
+
+
+def test_seek_ascending():
+    oid = ObjectId()
+    assert seek_query({"age": 30, "_id": oid}, BY_AGE) == {"$or": [
+        {"age": {"$gt": 30}},
+        {"$and": [{"age": 30}, {"_id": {"$gt": oid}}]},
+    ]}
+
+
+def test_seek_ascending_after_null_includes_every_non_null():
+    oid = ObjectId()
+    assert seek_query({"age": None, "_id": oid}, BY_AGE) == {"$or": [
+        {"age": {"$ne": None}},
+        {"$and": [{"age": None}, {"_id": {"$gt": oid}}]},
+    ]}
+
+
+def test_seek_descending_keeps_nulls_last():
+    oid = ObjectId()
+    assert seek_query({"score": 5, "_id": oid}, BY_SCORE_DESC) == {"$or": [
+        {"$or": [{"score": {"$lt": 5}}, {"score": None}]},
+        {"$and": [{"score": 5}, {"_id": {"$gt": oid}}]},
+    ]}
+
+
+def test_seek_descending_from_null_only_continues_among_nulls():
+    oid = ObjectId()
+    assert seek_query({"score": None, "_id": oid}, BY_SCORE_DESC) == {
+        "$and": [{"score": None}, {"_id": {"$gt": oid}}]
+    }
+
+
+def test_apply_cursor_combines_with_filter():
+    oid = ObjectId()
+    token = encode_cursor({"_id": oid}, [("_id", 1)])
+
+    assert apply_cursor({}, None, [("_id", 1)]) == {}
+    assert apply_cursor({}, token, [("_id", 1)]) == {"_id": {"$gt": oid}}
+    assert apply_cursor({"gender": "F"}, token, [("_id", 1)]) == {
+        "$and": [{"gender": "F"}, {"_id": {"$gt": oid}}]
+    }
+
+
+def test_next_cursor_only_for_full_pages():
+    page = [{"_id": ObjectId(), "age": age} for age in (20, 21)]
+
+    assert next_cursor(page, 3, BY_AGE) is None
+    assert next_cursor(page, 0, BY_AGE) is None
+    token = next_cursor(page, 2, BY_AGE)
+    assert decode_cursor(token, BY_AGE) == {"age": 21, "_id": page[-1]["_id"]}
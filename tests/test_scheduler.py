@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from app.utils.scheduler import Scheduler
+
+
+def _matches(doc: dict, condition: dict) -> bool:
+    for field, expected in condition.items():
+        if field == "$or":
+            if not any(_matches(doc, branch) for branch in expected):
+                return False
+        elif isinstance(expected, dict):
+            if not all(op == "$lte" and doc.get(field) <= value for op, value in expected.items()):
+                return False
+        elif doc.get(field) != expected:
+            return False
+    return True
+
+
+class FakeLeases:
+    """job_leases double: an upsert whose filter misses an existing _id raises DuplicateKeyError."""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.docs.get(query["_id"])
+        if doc is None:
+            if upsert:
+                self.docs[query["_id"]] = {"_id": query["_id"], **update["$set"]}
+            return
+        if _matches(doc, query):
+            doc.update(update["$set"])
+        elif upsert:
+            raise DuplicateKeyError("E11000 duplicate key error")
+
+
+def make_scheduler(owner: str, leases, calls: list) -> Scheduler:
+    scheduler = Scheduler(owner=owner)
+    # Leases without start(), so jobs only run when the test runs them
+    scheduler._leases = leases
+
+    async def job():
+        calls.append(owner)
+
+    scheduler.register("job", job, interval=60, exclusive=True)
+    return scheduler
+
+
+def test_only_the_lease_holder_runs_an_exclusive_job():
+    async def scenario():
+        leases, calls = FakeLeases(), []
+        first = make_scheduler("first", leases, calls)
+        second = make_scheduler("second", leases, calls)
+
+        assert await first.run("job")
+        assert not await second.run("job")
+        # The holder keeps its lease on the next tick
+        assert await first.run("job")
+
+        assert calls == ["first", "first"]
+        assert leases.docs["job"]["owner"] == "first"
+        assert second.stats()["jobs"]["job"]["skipped"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_expired_lease_can_be_taken_over():
+    async def scenario():
+        leases, calls = FakeLeases(), []
+        first = make_scheduler("first", leases, calls)
+        second = make_scheduler("second", leases, calls)
+
+        await first.run("job")
+        leases.docs["job"]["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+        assert await second.run("job")
+
+        assert calls == ["first", "second"]
+        assert leases.docs["job"]["owner"] == "second"
+
+    asyncio.run(scenario())
+
+
+def test_failing_job_is_recorded():
+    async def scenario():
+        scheduler = Scheduler(owner="only")
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        scheduler.register("fail", fail, interval=60)
+        assert not await scheduler.run("fail")
+
+        stats = scheduler.stats()["jobs"]["fail"]
+        assert (stats["runs"], stats["failures"], stats["last_error"]) == (1, 1, "boom")
+
+    asyncio.run(scenario())
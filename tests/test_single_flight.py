@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.utils.single_flight import SingleFlight, SwipeVersions
+
+
+class Computation:
+    """Counts calls and finishes only when released."""
+
+    def __init__(self, result="result", error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_computation():
+    async def scenario():
+        flight = SingleFlight()
+        compute = Computation()
+        waiters = [asyncio.create_task(flight.do("key", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        compute.release.set()
+
+        assert await asyncio.gather(*waiters) == ["result"] * 3
+        assert compute.calls == 1
+        assert flight.stats() == {"in_flight": 0, "calls": 3, "shared": 2}
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_do_not_share():
+    async def scenario():
+        flight = SingleFlight()
+        compute = Computation()
+        compute.release.set()
+
+        await asyncio.gather(flight.do("a", compute), flight.do("b", compute))
+        assert compute.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_finished_computation_is_not_reused():
+    async def scenario():
+        flight = SingleFlight()
+        compute = Computation()
+        compute.release.set()
+
+        await flight.do("key", compute)
+        await flight.do("key", compute)
+        assert compute.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_error_reaches_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+        compute = Computation(error=RuntimeError("boom"))
+        waiters = [asyncio.create_task(flight.do("key", compute)) for _ in range(2)]
+        await asyncio.sleep(0)
+        compute.release.set()
+
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert compute.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_the_others():
+    async def scenario():
+        flight = SingleFlight()
+        compute = Computation()
+        first = asyncio.create_task(flight.do("key", compute))
+        second = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        compute.release.set()
+        assert await second == "result"
+
+    asyncio.run(scenario())
+
+
+def test_swipe_versions_only_move_forward():
+    versions = SwipeVersions(max_size=10, ttl=60)
+
+    assert versions.get("user") == 0
+    first = versions.bump("user")
+    assert versions.get("user") == first
+    assert versions.bump("other") > first
+    assert versions.bump("user") > first
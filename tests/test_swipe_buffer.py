@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.utils.swipe_buffer import DUPLICATE_KEY, BufferFullError, SwipeBuffer
+
+
+class FakeSwipes:
+    """insert_many double that can fail some indexes with a write error."""
+
+    def __init__(self, fail=None, error=None):
+        self.fail = fail or {}
+        self.error = error
+        self.inserted = []
+
+    async def insert_many(self, records, ordered=True):
+        if self.error is not None:
+            raise self.error
+        errors = [{"index": i, "code": code, "errmsg": "write failed"}
+                  for i, code in self.fail.items() if i < len(records)]
+        self.inserted.extend(record for i, record in enumerate(records) if i not in self.fail)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def swipe(swiper_id, swiped_id=None, liked=True) -> dict:
+    return {"swiper_id": swiper_id, "swiped_id": swiped_id or ObjectId(), "liked": liked}
+
+
+def make_buffer(max_size=10, batch_size=10) -> SwipeBuffer:
+    # A long interval so only explicit flushes write
+    return SwipeBuffer(max_size=max_size, batch_size=batch_size, interval=60)
+
+
+def test_add_dedupes_on_swiper_and_swiped():
+    buffer = make_buffer()
+    swiper, swiped = ObjectId(), ObjectId()
+
+    assert buffer.add(swipe(swiper, swiped, liked=False))
+    assert not buffer.add(swipe(swiper, swiped, liked=True))
+    assert buffer.duplicates == 1
+    assert len(buffer) == 1
+    assert buffer.pending_for(swiper) == {swiped: False}
+
+
+def test_add_rejects_when_full():
+    buffer = make_buffer(max_size=1)
+    swiper = ObjectId()
+    buffer.add(swipe(swiper))
+
+    with pytest.raises(BufferFullError):
+        buffer.add(swipe(swiper))
+    assert buffer.rejected == 1
+
+
+def test_flush_before_start_writes_nothing():
+    buffer = make_buffer()
+    buffer.add(swipe(ObjectId()))
+
+    assert asyncio.run(buffer.flush()) == 0
+    assert len(buffer) == 1
+
+
+def test_flush_writes_batch_and_reports_inserted_records():
+    async def scenario():
+        buffer = make_buffer(batch_size=2)
+        collection = FakeSwipes()
+        flushed = []
+
+        async def on_flush(records):
+            flushed.extend(records)
+
+        swiper = ObjectId()
+        records = [swipe(swiper) for _ in range(3)]
+        for record in records:
+            buffer.add(record)
+        buffer.start(collection, on_flush=on_flush)
+
+        assert await buffer.flush() == 2
+        assert collection.inserted == records[:2]
+        assert flushed == records[:2]
+        assert list(buffer.pending_for(swiper)) == [records[2]["swiped_id"]]
+
+        await buffer.stop()
+        assert collection.inserted == records
+        assert len(buffer) == 0
+        assert buffer.pending_for(swiper) == {}
+
+    asyncio.run(scenario())
+
+
+def test_flush_drops_stored_duplicates():
+    async def scenario():
+        buffer = make_buffer()
+        collection = FakeSwipes(fail={0: DUPLICATE_KEY})
+        flushed = []
+
+        async def on_flush(records):
+            flushed.extend(records)
+
+        records = [swipe(ObjectId()), swipe(ObjectId())]
+        for record in records:
+            buffer.add(record)
+        buffer.start(collection, on_flush=on_flush)
+
+        assert await buffer.flush() == 2
+        assert flushed == records[1:]
+        assert len(buffer) == 0
+        await buffer.stop()
+
+    asyncio.run(scenario())
+
+
+def test_failed_flush_keeps_batch_queued():
+    async def scenario():
+        buffer = make_buffer()
+        collection = FakeSwipes(error=ConnectionError("down"))
+        record = swipe(ObjectId())
+        buffer.add(record)
+        buffer.start(collection)
+
+        assert await buffer.flush() == 0
+        assert len(buffer) == 1
+        assert buffer.failed_flushes == 1
+
+        collection.error = None
+        assert await buffer.flush() == 1
+        assert collection.inserted == [record]
+        await buffer.stop()
+
+    asyncio.run(scenario())